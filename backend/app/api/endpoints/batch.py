@@ -0,0 +1,142 @@
+"""
+Batched requests.
+
+Runs several sub-requests against the app's own routes in-process, so a
+client pays for one round trip and one token validation.
+"""
+import asyncio
+import json
+from urllib.parse import urlsplit
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import JSONResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from app.schemas.batch.batch_requests import BatchItem, BatchRequestBody
+from app.utils.auth_utils import validate_token, validated_tokens
+from app.utils.logging_utils import get_logger
+
+
+batch_router = APIRouter()
+logger = get_logger(__name__)
+http_bearer = HTTPBearer()
+
+BATCH_CONCURRENCY = 5
+BATCH_ITEM_TIMEOUT = 10
+MAX_BATCH_ITEM_RESPONSE_BYTES = 1024 * 1024
+# Streamed responses are unbounded or never end, so they are not batched.
+STREAMING_PATHS = ("/events/export", "/events/stream", "/users/pictures/")
+
+class ResponseTooLarge(Exception):
+    """
+    A sub-request's response outgrew MAX_BATCH_ITEM_RESPONSE_BYTES.
+    """
+
+async def dispatch(request: Request, item: BatchItem, authorization: str) -> dict:
+    """
+    Run one sub-request through the app and collect its response.
+    """
+    url = urlsplit(item.path)
+    headers = {key.lower(): value for key, value in item.headers.items()}
+    # Items may bring their own credentials, e.g. a refresh token for /auth/token/refresh.
+    headers.setdefault("authorization", authorization)
+    body = b""
+    if item.body is not None:
+        body = json.dumps(item.body).encode("utf-8")
+        headers.setdefault("content-type", "application/json")
+    headers["content-length"] = str(len(body))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": item.method,
+        "scheme": request.url.scheme,
+        "path": url.path,
+        "raw_path": url.path.encode("utf-8"),
+        "query_string": url.query.encode("utf-8"),
+        "root_path": "",
+        "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()],
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+    }
+
+    finished = asyncio.Event()
+    body_sent = False
+    response = {"status": None, "headers": {}, "chunks": [], "size": 0}
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {key.decode("latin-1"): value.decode("latin-1")
+                                   for key, value in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            response["size"] += len(chunk)
+            if response["size"] > MAX_BATCH_ITEM_RESPONSE_BYTES:
+                raise ResponseTooLarge()
+            response["chunks"].append(chunk)
+            if not message.get("more_body"):
+                finished.set()
+
+    try:
+        await asyncio.wait_for(request.app(scope, receive, send), BATCH_ITEM_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"id": item.id, "status": status.HTTP_504_GATEWAY_TIMEOUT, "headers": {},
+                "body": {"detail": "Sub-request timed out."}}
+    except ResponseTooLarge:
+        return {"id": item.id, "status": status.HTTP_502_BAD_GATEWAY, "headers": {},
+                "body": {"detail": "Sub-request response too large to batch."}}
+    finally:
+        finished.set()
+
+    raw = b"".join(response["chunks"])
+    content_type = response["headers"].get("content-type", "")
+    if "application/json" in content_type and raw:
+        payload = json.loads(raw)
+    else:
+        payload = raw.decode("utf-8", errors="replace") or None
+
+    etag = response["headers"].get("etag")
+    return {"id": item.id, "status": response["status"],
+            "headers": {"etag": etag} if etag else {}, "body": payload}
+
+@batch_router.post('/')
+async def batch(body: BatchRequestBody,
+                request: Request,
+                access_token: HTTPAuthorizationCredentials = Depends(http_bearer)):
+    """
+    Run several requests at once.
+    """
+    token = access_token.credentials
+    payload = await validate_token(token, "access")
+
+    # Sub-requests inherit this context, so they reuse the validation above.
+    validated_tokens.set({(token, "access"): payload})
+    authorization = f"Bearer {token}"
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(item: BatchItem) -> dict:
+        if not item.path.startswith("/") or item.path.startswith("/batch"):
+            return {"id": item.id, "status": status.HTTP_400_BAD_REQUEST, "headers": {},
+                    "body": {"detail": "Invalid sub-request path."}}
+        if urlsplit(item.path).path.rstrip("/").startswith(STREAMING_PATHS):
+            return {"id": item.id, "status": status.HTTP_400_BAD_REQUEST, "headers": {},
+                    "body": {"detail": "Streaming routes cannot be batched."}}
+        async with semaphore:
+            try:
+                return await dispatch(request, item, authorization)
+            except Exception:
+                logger.exception("Error in batch sub-request", extra={"payload": {"path": item.path}})
+                return {"id": item.id, "status": status.HTTP_500_INTERNAL_SERVER_ERROR, "headers": {},
+                        "body": {"detail": "Sub-request failed."}}
+
+    results = await asyncio.gather(*(run(item) for item in body.requests))
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content={"responses": results})
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+from app.api.endpoints.user import get_current_user_id
+from app.schemas.bookings.booking_requests import BookingRequest
+from app.services.booking_services import book_event
+
+
+bookings_router = APIRouter()
+
+@bookings_router.post('/')
+async def book_an_event(booking: BookingRequest, user_id: str = Depends(get_current_user_id)):
+    """
+    Book a seat on an event.
+    """
+    booked = await book_event(booking.group_id, booking.event_id, holder=f"user:{user_id}")
+    status_code = status.HTTP_200_OK if booked["already_booked"] else status.HTTP_201_CREATED
+    return JSONResponse(status_code=status_code, content=booked)
@@ -1,11 +1,123 @@
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import JSONResponse
-from app.api.endpoints.user import get_current_user
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.api.endpoints.user import get_current_user, get_current_user_id
 from app.schemas.events.event_requests import IncomingEventSchema, IncomingEventUpdate
-from app.services.events_services import add_event, update_event, delete_event
+from app.services.events_services import add_event, update_event, delete_event, list_events, search_events
+from app.services.events_services import export_events, fetch_events
+from app.services.push_services import stream_event_changes
+from app.services.import_services import create_import_job, get_import_job, run_import_job, resume_import_job
+from app.services.import_services import IMPORT_FORMATS, IMPORT_CONTENT_TYPES
+from app.utils.version_utils import get_event_version, event_etag, etag_matches, etag_version
+from app.utils.logging_utils import get_logger
 
 
 events_router = APIRouter()
+logger = get_logger(__name__)
+
+@events_router.get('/')
+async def get_events(start: Optional[datetime] = None,
+                     end: Optional[datetime] = None,
+                     status_filter: Literal["active", "cancelled"] = Query("active", alias="status"),
+                     group_id: Optional[str] = None,
+                     limit: int = Query(20, ge=1, le=100),
+                     cursor: Optional[str] = None,
+                     user_id: str = Depends(get_current_user_id)):
+    """
+    List events in date order, upcoming ones by default.
+    """
+    events_page = await list_events(event_status=status_filter, start=start, end=end,
+                                    limit=limit, cursor=cursor, group_id=group_id)
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content=jsonable_encoder(events_page))
+
+@events_router.get('/search')
+async def search_for_events(q: str = Query(..., min_length=1, max_length=200),
+                            status_filter: Optional[Literal["active", "cancelled"]] = Query(None, alias="status"),
+                            start: Optional[datetime] = None,
+                            end: Optional[datetime] = None,
+                            page: int = Query(1, ge=1),
+                            limit: int = Query(20, ge=1, le=100),
+                            user_id: str = Depends(get_current_user_id)):
+    """
+    Search events by keyword.
+    """
+    results = await search_events(q, event_status=status_filter, start=start, end=end,
+                                  page=page, limit=limit)
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content=results)
+
+@events_router.get('/export')
+async def export_my_events(export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+                           cursor: Optional[str] = None,
+                           user_id: str = Depends(get_current_user_id)):
+    """
+    Export all of the user's events.
+    """
+    media_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+    return StreamingResponse(
+        export_events(user_id, export_format, cursor),
+        media_type=media_types[export_format],
+        headers={"Content-Disposition": f'attachment; filename="events.{export_format}"'}
+    )
+
+@events_router.get('/stream')
+async def stream_events(group_id: Optional[str] = None,
+                        last_event_id: Optional[int] = Header(None),
+                        user_id: str = Depends(get_current_user_id)):
+    """
+    Push event changes, for one group or the whole feed.
+    """
+    return StreamingResponse(
+        stream_event_changes(group_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@events_router.post('/import', status_code=status.HTTP_202_ACCEPTED)
+async def import_events(request: Request,
+                        background_tasks: BackgroundTasks,
+                        import_format: Optional[Literal["csv", "ndjson"]] = Query(None, alias="format"),
+                        content_type: Optional[str] = Header(None),
+                        content_length: Optional[int] = Header(None),
+                        user_id: str = Depends(get_current_user_id)):
+    """
+    Start importing events from a CSV or NDJSON request body. The format
+    comes from `format`, or else from the Content-Type.
+    """
+    if not import_format:
+        import_format = IMPORT_CONTENT_TYPES.get((content_type or "").split(";", 1)[0].strip().lower())
+    if import_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Unsupported import format. Use csv or ndjson.")
+
+    job_id = await create_import_job(user_id, request.stream(), import_format, content_length)
+    background_tasks.add_task(run_import_job, job_id)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED,
+                        content={"job_id": job_id, "status": "pending"})
+
+@events_router.get('/import/{job_id}')
+async def get_import_progress(job_id: str, user_id: str = Depends(get_current_user_id)):
+    """
+    Get an import job's progress and row errors.
+    """
+    job = await get_import_job(job_id, user_id)
+    return JSONResponse(status_code=status.HTTP_200_OK, content=job)
+
+@events_router.post('/import/{job_id}/resume', status_code=status.HTTP_202_ACCEPTED)
+async def resume_import(job_id: str,
+                        background_tasks: BackgroundTasks,
+                        user_id: str = Depends(get_current_user_id)):
+    """
+    Resume a failed or interrupted import job.
+    """
+    job = await resume_import_job(job_id, user_id)
+    background_tasks.add_task(run_import_job, job_id)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED,
+                        content={"job_id": job_id, "status": "pending",
+                                 "rows_processed": job["rows_processed"]})
 
 @events_router.post('/')
 async def add_new_event(event: IncomingEventSchema, user: dict = Depends(get_current_user)):
@@ -14,24 +126,34 @@ async def add_new_event(event: IncomingEventSchema, user: dict = Depends(get_cur
     """
     user_id = user.get("_id")
     added_event = await add_event(user_id=user_id, event=event)
-    added_event["date"] = str(added_event["date"])
-    print("Added event: ", added_event)
+    logger.info("Added event", extra={"msg_type": "event.added",
+                                      "payload": {"event_id": added_event.get("event_id"), "user_id": user_id}})
     return JSONResponse(
         status_code=status.HTTP_201_CREATED,
-        content=added_event
+        content=jsonable_encoder(added_event)
     )
 
 @events_router.put('/{event_id}')
 async def edit_event(event_id: str,
                      event: IncomingEventUpdate,
+                     if_match: Optional[str] = Header(None),
                      user: dict = Depends(get_current_user)):
     """
-    Edit an event.
+    Edit an event. With If-Match the edit only applies to the version the
+    client last saw.
     """
+    expected_version = None
+    if if_match and if_match.strip() != "*":
+        expected_version = etag_version(if_match, event_id)
+        if expected_version is None:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
+                                detail="Event has changed.")
+
     user_id = user.get("_id")
-    updated_event = await update_event(user_id, event_id, event)
+    updated_event = await update_event(user_id, event_id, event, expected_version=expected_version)
     return JSONResponse(status_code=status.HTTP_200_OK,
-                        content=updated_event)
+                        content=jsonable_encoder(updated_event),
+                        headers={"ETag": event_etag(event_id, updated_event["version"])})
 
 @events_router.delete('/{event_id}')
 async def delete_an_event(event_id: str, user: dict = Depends(get_current_user)):
@@ -42,3 +164,30 @@ async def delete_an_event(event_id: str, user: dict = Depends(get_current_user))
     await delete_event(user_id, event_id)
     return JSONResponse(status_code=status.HTTP_200_OK,
                         content={"status": "success", "message": "Deleted successfully."})
+
+@events_router.get('/{event_id}')
+async def get_event(event_id: str,
+                    group_id: Optional[str] = None,
+                    if_none_match: Optional[str] = Header(None),
+                    user_id: str = Depends(get_current_user_id)):
+    """
+    Get an event. Defaults to the current user's own events.
+    """
+    group_id = group_id or user_id
+
+    # Answer unchanged reads from the cached version alone.
+    version = await get_event_version(group_id, event_id)
+    if version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Event not found.")
+    if etag_matches(if_none_match, event_etag(event_id, version)):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers={"ETag": event_etag(event_id, version)})
+
+    events = await fetch_events([(group_id, event_id)])
+    if not events:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Event not found.")
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content=jsonable_encoder(events[0]),
+                        headers={"ETag": event_etag(event_id, events[0].get("version", 0))})
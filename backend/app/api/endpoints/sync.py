@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.api.endpoints.user import get_current_user_id
+from app.services.sync_services import get_changes
+
+
+sync_router = APIRouter()
+
+@sync_router.get('/')
+async def sync(since: str = "0",
+               limit: int = Query(500, ge=1, le=1000),
+               user_id: str = Depends(get_current_user_id)):
+    """
+    Get changes since the last sync token.
+    """
+    if not since.isdigit():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Invalid sync token.")
+    changes = await get_changes(user_id, int(since), limit)
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content=jsonable_encoder(changes))
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, status, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from typing import Optional
+from fastapi import APIRouter, status, HTTPException, Depends, Header, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.security import HTTPBearer
 from fastapi.security import HTTPAuthorizationCredentials
 from app.utils.auth_utils import validate_token
 from app.services.user_services import find_user_by_id, update_username
+from app.services.stats_services import get_user_stats, recompute_user_stats
+from app.services.picture_services import update_profile_picture, get_picture_file, picture_etag
+from app.services.picture_services import PICTURE_MEDIA_TYPES
+from app.utils.version_utils import get_user_version, user_etag, etag_matches
 
 
 user_router = APIRouter()
 http_bearer = HTTPBearer()
 
+# Picture URLs name their content, so they never need revalidating.
+PICTURE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 async def get_current_user(access_token: HTTPAuthorizationCredentials = Depends(http_bearer)):
     """
     Get current user.
@@ -24,19 +33,35 @@ async def get_current_user(access_token: HTTPAuthorizationCredentials = Depends(
                             detail="User not found.")
     return user
 
+async def get_current_user_id(access_token: HTTPAuthorizationCredentials = Depends(http_bearer)) -> str:
+    """
+    Get current user's ID without loading their document.
+    """
+    payload = await validate_token(access_token.credentials, "access")
+    return payload.get("sub")
+
 @user_router.get('/me')
-async def get_me(user: dict = Depends(get_current_user)):
+async def get_me(if_none_match: Optional[str] = Header(None),
+                 user_id: str = Depends(get_current_user_id)):
     """
     Get current user.
     """
+    # Answer unchanged reads from the cached version alone.
+    version = await get_user_version(user_id)
+    if version is not None and etag_matches(if_none_match, user_etag(user_id, version)):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers={"ETag": user_etag(user_id, version)})
+
+    user = await find_user_by_id(user_id)
     if not user:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Not authenticated.")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="User not found.")
 
     user["user_id"] = user.pop("_id")
     return JSONResponse(
         status_code=status.HTTP_200_OK,
-        content=user)
+        content=jsonable_encoder(user),
+        headers={"ETag": user_etag(user_id, user.get("version", 0))})
 
 @user_router.put('/me/username')
 async def update_user_name(username: str, user: dict = Depends(get_current_user)):
@@ -53,3 +78,53 @@ async def update_user_name(username: str, user: dict = Depends(get_current_user)
         status_code=status.HTTP_200_OK,
         content=updated_user
     )
+
+@user_router.put('/me/picture')
+async def update_my_picture(request: Request,
+                            content_length: Optional[int] = Header(None),
+                            user_id: str = Depends(get_current_user_id)):
+    """
+    Upload a PNG or JPEG profile picture as the raw request body.
+    """
+    updated_picture = await update_profile_picture(user_id, request.stream(), content_length)
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content=updated_picture)
+
+@user_router.get('/pictures/{filename}')
+async def get_picture(filename: str,
+                      size: Optional[int] = None,
+                      if_none_match: Optional[str] = Header(None)):
+    """
+    Serve a stored profile picture, or one of its thumbnails with `size`.
+    Supports conditional and range requests.
+    """
+    digest, _, picture_type = filename.partition(".")
+    etag = picture_etag(digest, size)
+    headers = {"ETag": etag, "Cache-Control": PICTURE_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path, stat_result = await get_picture_file(digest, picture_type, size)
+    # FileResponse answers Range requests itself and hands the file to the
+    # server to send directly when it supports the pathsend extension.
+    return FileResponse(path, stat_result=stat_result, headers=headers,
+                        media_type=PICTURE_MEDIA_TYPES[picture_type])
+
+@user_router.get('/me/stats')
+async def get_my_stats(user_id: str = Depends(get_current_user_id)):
+    """
+    Get current user's event stats.
+    """
+    stats = await get_user_stats(user_id)
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content=jsonable_encoder(stats))
+
+@user_router.post('/me/stats/recompute')
+async def recompute_my_stats(user_id: str = Depends(get_current_user_id)):
+    """
+    Rebuild current user's event stats from their events.
+    """
+    await recompute_user_stats(user_id)
+    stats = await get_user_stats(user_id)
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content=jsonable_encoder(stats))
@@ -0,0 +1,144 @@
+"""
+Mongo index management.
+
+Indexes are declared here and applied idempotently at startup or with:
+
+    python -m app.db.indexes            # create missing indexes
+    python -m app.db.indexes --check    # also explain every query shape
+
+Events are embedded in their organizer's user document, keyed by event
+ID, so "events by owner" is the users `_id` index and "events by date" is
+served by the Redis time index (app.utils.events_utils) rather than by
+Mongo; no Mongo index can cover dynamic map keys.
+"""
+import argparse
+import asyncio
+from bson import ObjectId
+from pymongo import ASCENDING, errors
+from app.db.mongo_client import db, users_collection, bookings_collection, analytics_collection
+from app.db.resilience import mongo_call
+
+
+INDEX_SPECS = [
+    {
+        "collection": users_collection,
+        "keys": [("email", ASCENDING)],
+        "name": "email_unique",
+        "unique": True,
+    },
+    {
+        "collection": users_collection,
+        "keys": [("username", ASCENDING)],
+        "name": "username_unique",
+        "unique": True,
+        "partialFilterExpression": {"username": {"$type": "string"}},
+    },
+    {
+        "collection": bookings_collection,
+        "keys": [("event_id", ASCENDING), ("holder", ASCENDING)],
+        "name": "event_holder_unique",
+        "unique": True,
+    },
+]
+
+# One sample of every query the services run, as (name, collection, kind, query).
+QUERY_SHAPES = [
+    ("find_user_by_email", users_collection, "find", {"email": "someone@example.com"}),
+    ("find_user_by_username", users_collection, "find", {"username": "someone"}),
+    ("find_user_by_id", users_collection, "find", {"_id": ObjectId()}),
+    ("find_event_owner", users_collection, "find",
+     {"_id": ObjectId(), "events.00000000-0000-0000-0000-000000000000": {"$exists": True}}),
+    ("fetch_events", users_collection, "find", {"_id": {"$in": [ObjectId(), ObjectId()]}}),
+    ("get_groups", users_collection, "find_sorted", {}),
+    ("export_events", users_collection, "aggregate", [{"$match": {"_id": ObjectId()}}]),
+    ("load_event_bookings", bookings_collection, "find", {"event_id": "00000000-0000-0000-0000-000000000000"}),
+    ("get_user_stats", analytics_collection, "find", {"_id": ObjectId()}),
+    ("recompute_user_stats", users_collection, "aggregate", [{"$match": {"_id": ObjectId()}}]),
+    ("load_usernames_into_bloom_filter", users_collection, "find", {"username": {"$type": "string"}}),
+    ("build_event_index", users_collection, "find", {"events": {"$exists": True}}),
+]
+
+# Query shapes allowed to scan, with the reason. These read (nearly) every
+# document anyway, so an index would only add write cost.
+ALLOWED_SCANS = {
+    # One-off backfill at startup, behind the events:time:built flag. An
+    # index on "events" would copy every embedded event into the index.
+    "build_event_index": "one-off walk of every user document",
+}
+
+async def ensure_indexes():
+    """
+    Create every declared index that does not exist yet.
+    """
+    for spec in INDEX_SPECS:
+        options = {key: value for key, value in spec.items() if key not in ("collection", "keys")}
+        collection = spec["collection"]
+        try:
+            await mongo_call(collection.create_index, spec["keys"], background=True, **options,
+                             idempotent=True, timeout=60)
+        except errors.OperationFailure as exc:
+            # Usually an index of the same name with other options, or duplicate data.
+            raise RuntimeError(f"Failed to create index {spec['name']} on {collection.name}: {exc}") from exc
+    print("Indexes are in place.")
+
+def plan_stages(plan: dict) -> set:
+    """
+    Every stage name in a query plan tree.
+    """
+    stages = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.add(plan["stage"])
+        for value in plan.values():
+            stages |= plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages |= plan_stages(value)
+    return stages
+
+async def explain_query_shape(collection, kind: str, query) -> dict:
+    """
+    The explain output of one query shape.
+    """
+    if kind == "aggregate":
+        return await db.command("aggregate", collection.name, pipeline=query, explain=True)
+    cursor = collection.find(query)
+    if kind == "find_sorted":
+        cursor = cursor.sort("_id", ASCENDING).limit(5)
+    return await cursor.explain()
+
+async def verify_query_plans():
+    """
+    Explain every query shape and fail if any of them scans a collection,
+    other than the ones in ALLOWED_SCANS.
+    """
+    scanning = []
+    for name, collection, kind, query in QUERY_SHAPES:
+        explained = await explain_query_shape(collection, kind, query)
+        winning_plans = [explained.get("queryPlanner", {}).get("winningPlan"),
+                         explained.get("stages"), explained.get("shards")]
+        if "COLLSCAN" not in plan_stages(winning_plans):
+            continue
+        if name in ALLOWED_SCANS:
+            print(f"{name} does a COLLSCAN (allowed: {ALLOWED_SCANS[name]}).")
+        else:
+            scanning.append(name)
+    if scanning:
+        raise RuntimeError(f"Query shapes doing a COLLSCAN: {', '.join(scanning)}")
+    print(f"All {len(QUERY_SHAPES)} query shapes use an index or an allowed scan.")
+
+async def main():
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Apply Mongo indexes.")
+    parser.add_argument("--check", action="store_true",
+                        help="explain every query shape and fail on a COLLSCAN")
+    args = parser.parse_args()
+
+    await ensure_indexes()
+    if args.check:
+        await verify_query_plans()
+
+if __name__ == "__main__":
+    asyncio.run(main())
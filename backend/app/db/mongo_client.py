@@ -3,10 +3,15 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import MONGO_HOST
 
 try:
-    mongo_client = AsyncIOMotorClient(f"mongodb://{MONGO_HOST}:27017/", serverSelectionTimeoutMS=5000)
+    mongo_client = AsyncIOMotorClient(f"mongodb://{MONGO_HOST}:27017/",
+                                      serverSelectionTimeoutMS=5000,
+                                      connectTimeoutMS=2000,
+                                      socketTimeoutMS=5000)
 
     db = mongo_client["FitConnect"]
     users_collection = db.users
+    bookings_collection = db.bookings
+    analytics_collection = db.analytics
 
 except errors.ServerSelectionTimeoutError as exc:
     raise ConnectionError("Failed to connect to MongoDB: Server Selection Timeout.") from exc
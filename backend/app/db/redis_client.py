@@ -5,7 +5,7 @@ from app.core.config import REDIS_HOST
 
 try:
     # Connect to Redis
-    redis_client = redis.Redis(host=REDIS_HOST)
+    redis_client = redis.Redis(host=REDIS_HOST, socket_timeout=2, socket_connect_timeout=2)
 
 except ConnectionError as e:
     # Handle connection error (e.g., retry, log, alert)
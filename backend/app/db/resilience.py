@@ -0,0 +1,176 @@
+"""
+Resilience layer for Redis and Mongo calls.
+
+Every datastore call goes through `guarded`, which bounds it with a
+per-operation timeout, retries idempotent operations a bounded number of
+times and trips a per-backend circuit breaker when the backend keeps failing.
+"""
+import asyncio
+import random
+import time
+from aioredis.exceptions import ConnectionError as RedisConnectionError
+from aioredis.exceptions import TimeoutError as RedisTimeoutError
+from pymongo import errors
+from redis.exceptions import ConnectionError as SyncRedisConnectionError
+from redis.exceptions import TimeoutError as SyncRedisTimeoutError
+
+
+REDIS_OP_TIMEOUT = 0.5
+MONGO_OP_TIMEOUT = 2.0
+IDEMPOTENT_RETRIES = 2
+RETRY_BACKOFF = 0.05
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 10
+
+
+class DatastoreUnavailable(ConnectionError):
+    """
+    Raised when a datastore call times out, keeps failing or its breaker is open.
+    """
+    def __init__(self, backend: str, reason: str):
+        super().__init__(f"{backend} unavailable: {reason}")
+        self.backend = backend
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Opens after `failure_threshold` failures in a row. Once `reset_timeout`
+    seconds have passed it lets a single trial call through (half-open);
+    that call either closes the breaker again or re-opens it.
+    """
+    def __init__(self, name: str,
+                 failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """
+        Current breaker state: closed, open or half-open.
+        """
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go through.
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        """
+        Close the breaker.
+        """
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        """
+        Count a failure, opening the breaker at the threshold.
+        """
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        Give back a half-open trial slot without recording an outcome.
+        """
+        self.trial_in_flight = False
+
+
+BREAKERS = {
+    "redis": CircuitBreaker("redis"),
+    "mongo": CircuitBreaker("mongo"),
+}
+
+TIMEOUTS = {
+    "redis": REDIS_OP_TIMEOUT,
+    "mongo": MONGO_OP_TIMEOUT,
+}
+
+# Errors that mean the backend is unhealthy, as opposed to errors the backend
+# returned on purpose (duplicate key, wrong type...) which prove it is up.
+TRANSIENT_ERRORS = {
+    "redis": (asyncio.TimeoutError, RedisConnectionError, RedisTimeoutError,
+              SyncRedisConnectionError, SyncRedisTimeoutError),
+    "mongo": (asyncio.TimeoutError, errors.ConnectionFailure),
+}
+
+
+async def guarded(backend: str, func, *args, idempotent: bool = False, timeout: float = None, **kwargs):
+    """
+    Run `func(*args, **kwargs)` against `backend` with a timeout, bounded
+    retries (idempotent calls only) and the backend's circuit breaker.
+
+    Raises DatastoreUnavailable when the call cannot be completed.
+    """
+    breaker = BREAKERS[backend]
+    timeout = timeout or TIMEOUTS[backend]
+    attempts = 1 + (IDEMPOTENT_RETRIES if idempotent else 0)
+    last_exc = None
+
+    for attempt in range(attempts):
+        if not breaker.allow():
+            raise DatastoreUnavailable(backend, "circuit open") from last_exc
+        try:
+            result = await asyncio.wait_for(func(*args, **kwargs), timeout)
+        except TRANSIENT_ERRORS[backend] as exc:
+            breaker.record_failure()
+            last_exc = exc
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_success()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+        if attempt + 1 < attempts:
+            # Exponential backoff with jitter so retries do not stampede.
+            await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    raise DatastoreUnavailable(backend, type(last_exc).__name__) from last_exc
+
+
+async def redis_call(func, *args, idempotent: bool = False, **kwargs):
+    """
+    Guarded Redis call.
+    """
+    return await guarded("redis", func, *args, idempotent=idempotent, **kwargs)
+
+
+async def redis_sync_call(func, *args, idempotent: bool = False, **kwargs):
+    """
+    Guarded call to a blocking Redis client, run in a worker thread so it
+    cannot stall the event loop. The client's own socket timeout bounds
+    how long the thread can outlive a timed-out call.
+    """
+    return await guarded("redis", asyncio.to_thread, func, *args, idempotent=idempotent, **kwargs)
+
+
+async def mongo_call(func, *args, idempotent: bool = False, **kwargs):
+    """
+    Guarded Mongo call.
+    """
+    return await guarded("mongo", func, *args, idempotent=idempotent, **kwargs)
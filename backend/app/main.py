@@ -1,13 +1,29 @@
-from fastapi import FastAPI, Request
+import asyncio
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints.auth import auth_router
 from app.api.endpoints.email_auth import email_auth_router
 from app.api.endpoints.events import events_router
 from app.api.endpoints.user import user_router
+from app.api.endpoints.bookings import bookings_router
+from app.api.endpoints.sync import sync_router
+from app.api.endpoints.batch import batch_router
 from app.services.events_services import get_ussd_steps
 from app.utils.user_utils import create_bloom_filter
+from app.utils.events_utils import build_event_index
+from app.utils.search_utils import create_search_index
+from app.services.booking_services import flush_bookings, run_booking_flusher
+from app.services.sync_services import run_change_log_compactor
 from app.db.redis_client import test_redis_connection, redis_client
 from app.db.mongo_client import test_mongo_connection, mongo_client
+from app.db.indexes import ensure_indexes
+from app.db.resilience import DatastoreUnavailable, BREAKER_RESET_TIMEOUT
+from app.utils.logging_utils import setup_logging, shutdown_logging, get_logger, RequestIdMiddleware
+from app.utils.picture_utils import shutdown_picture_pool
+
+setup_logging()
+logger = get_logger(__name__)
 
 app = FastAPI()
 
@@ -18,24 +34,62 @@ app.add_middleware(
     allow_methods=["*"], 
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(email_auth_router)
 app.include_router(auth_router, prefix="/auth")
 app.include_router(user_router, prefix="/users")
 app.include_router(events_router, prefix="/events")
+app.include_router(bookings_router, prefix="/bookings")
+app.include_router(sync_router, prefix="/sync")
+app.include_router(batch_router, prefix="/batch")
+
+background_tasks = set()
+
+@app.exception_handler(DatastoreUnavailable)
+async def datastore_unavailable_handler(request: Request, exc: DatastoreUnavailable):
+    """
+    Answer quickly with 503 instead of hanging while a datastore is down.
+    """
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        content={"detail": "Service temporarily unavailable."},
+                        headers={"Retry-After": str(BREAKER_RESET_TIMEOUT)})
 
 @app.on_event("startup")
 async def startup_event():
     """
     This function is called when the app starts.
-    It will ensure the bloom filter is created if it does not exist.
+    It will ensure the Mongo indexes, the bloom filter and the events indexes exist.
+    Each step runs on its own, so one failing does not skip the others.
+    """
+    startup_steps = [
+        ("test_redis_connection", lambda: test_redis_connection(redis_client)),
+        ("test_mongo_connection", lambda: test_mongo_connection(mongo_client)),
+        ("ensure_indexes", ensure_indexes),
+        ("create_bloom_filter", create_bloom_filter),
+        ("create_search_index", create_search_index),
+        ("build_event_index", build_event_index),
+        # Persist bookings a previous run queued but did not write.
+        ("flush_bookings", flush_bookings),
+    ]
+    for name, step in startup_steps:
+        try:
+            await step()
+        except Exception:
+            logger.exception("Startup step failed", extra={"payload": {"step": name}})
+
+    flusher = asyncio.create_task(run_booking_flusher())
+    background_tasks.add(flusher)
+    compactor = asyncio.create_task(run_change_log_compactor())
+    background_tasks.add(compactor)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Stop the picture workers and flush queued log records before the process exits.
     """
-    try:
-        await create_bloom_filter()
-        await test_redis_connection(redis_client)
-        await test_mongo_connection(mongo_client)
-    except Exception as e:
-        print(f"Error occurred: {e}")
+    shutdown_picture_pool()
+    shutdown_logging()
 
 @app.route('/ussd', methods=['POST', 'GET'])
 def ussd_callback(request: Request):
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    method: Literal["GET", "POST", "PUT", "DELETE"]
+    path: str
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+class BatchRequestBody(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=20)
@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+
+
+class BookingRequest(BaseModel):
+    group_id: str
+    event_id: str
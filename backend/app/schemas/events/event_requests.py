@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Literal, Optional
 
@@ -12,6 +12,7 @@ class IncomingEventSchema(BaseModel):
     fee: int
     support_contact: str
     after_booking_message: str
+    capacity: Optional[int] = Field(None, ge=0)
 
 class IncomingEventUpdate(BaseModel):
     title: Optional[str] = None
@@ -22,3 +23,4 @@ class IncomingEventUpdate(BaseModel):
     fee: Optional[int] = None
     support_contact: Optional[str] = None
     after_booking_message: Optional[str] = None
+    capacity: Optional[int] = Field(None, ge=0)
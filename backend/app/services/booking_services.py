@@ -0,0 +1,167 @@
+"""
+Handle event bookings.
+
+Seats are reserved in Redis (see app.utils.booking_utils) and confirmed
+bookings are written to Mongo behind the request, in batches, by a
+flusher task. Bookings still queued when a worker stops are flushed by the
+next worker that starts.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+from bson import ObjectId, errors
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.db.mongo_client import users_collection, bookings_collection
+from app.db.redis_client import redis_client
+from app.db.resilience import mongo_call, redis_call
+from app.utils.booking_utils import reserve_seat, get_booking_details, load_booking_event
+from app.utils.booking_utils import BOOKINGS_PENDING, BOOKINGS_FLUSH_LOCK
+from app.utils.booking_utils import RESERVED, ALREADY_BOOKED, SOLD_OUT, NOT_LOADED, WRONG_GROUP
+from app.utils.lock_utils import acquire_lock, refresh_lock, release_lock
+from app.utils.logging_utils import get_logger
+
+
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL = 1
+FLUSH_LOCK_TTL = 30
+DUPLICATE_KEY = 11000
+
+logger = get_logger(__name__)
+
+async def book_event(group_id: str, event_id: str, holder: str) -> dict:
+    """
+    Book a seat on an event for a holder, e.g. "user:<id>" or "phone:<number>".
+    Booking again returns the holder's existing booking.
+    """
+    booking_id = str(uuid.uuid4())
+    booking = {
+        "booking_id": booking_id,
+        "event_id": event_id,
+        "group_id": group_id,
+        "holder": holder,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    booking_json = json.dumps(booking)
+
+    outcome, reserved_id = await reserve_seat(group_id, event_id, holder, booking_id, booking_json)
+    if outcome == NOT_LOADED:
+        await load_event_bookings(group_id, event_id)
+        outcome, reserved_id = await reserve_seat(group_id, event_id, holder, booking_id, booking_json)
+
+    if outcome == WRONG_GROUP:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Event not found.")
+    if outcome == SOLD_OUT:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Event is fully booked or not open for booking.")
+    if outcome not in (RESERVED, ALREADY_BOOKED):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Booking is temporarily unavailable.")
+
+    details = await get_booking_details(event_id)
+
+    return {
+        "booking_id": reserved_id,
+        "event_id": event_id,
+        "group_id": group_id,
+        "status": "confirmed",
+        "already_booked": outcome == ALREADY_BOOKED,
+        "fee": int(details.get("fee", 0)),
+        "support_contact": details.get("support_contact"),
+        "after_booking_message": details.get("after_booking_message"),
+    }
+
+async def load_event_bookings(group_id: str, event_id: str):
+    """
+    Load an event's capacity and existing bookings into Redis, including
+    bookings still waiting in the write-behind queue.
+    """
+    try:
+        document = await mongo_call(
+            users_collection.find_one,
+            {"_id": ObjectId(group_id), f"events.{event_id}": {"$exists": True}},
+            {f"events.{event_id}": 1, "_id": 0},
+            idempotent=True
+        )
+    except errors.InvalidId as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Event not found.") from exc
+    if not document:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Event not found.")
+
+    # Read the queue before Mongo: a booking flushed in between is then
+    # found in Mongo, so none is missed.
+    queued = await redis_call(redis_client.lrange, BOOKINGS_PENDING, 0, -1, idempotent=True)
+    bookings = await mongo_call(
+        lambda: bookings_collection.find({"event_id": event_id}, {"holder": 1}).to_list(length=None),
+        idempotent=True
+    )
+    holders = {booking["holder"]: booking["_id"] for booking in bookings}
+    for raw in queued:
+        booking = json.loads(raw)
+        if booking["event_id"] == event_id:
+            holders.setdefault(booking["holder"], booking["booking_id"])
+    await load_booking_event(event_id, group_id, document["events"][event_id], holders)
+
+async def flush_bookings() -> int:
+    """
+    Write queued bookings to Mongo in batches. Only one worker flushes at a
+    time; upserts keyed by booking ID make a replayed batch harmless.
+    """
+    lock_token = await acquire_lock(BOOKINGS_FLUSH_LOCK, FLUSH_LOCK_TTL)
+    if not lock_token:
+        return 0
+
+    flushed = 0
+    try:
+        while True:
+            queued = await redis_call(redis_client.lrange, BOOKINGS_PENDING, 0, FLUSH_BATCH_SIZE - 1,
+                                      idempotent=True)
+            if not queued:
+                break
+
+            operations = []
+            for raw in queued:
+                booking = json.loads(raw)
+                booking_id = booking.pop("booking_id")
+                booking["created_at"] = datetime.fromisoformat(booking["created_at"])
+                operations.append(UpdateOne({"_id": booking_id}, {"$setOnInsert": booking}, upsert=True))
+            try:
+                await mongo_call(bookings_collection.bulk_write, operations, ordered=False, idempotent=True)
+            except BulkWriteError as exc:
+                # A holder already booked under another ID (unique event/holder
+                # index) is persisted already; anything else is retried next time.
+                write_errors = exc.details.get("writeErrors", [])
+                if not write_errors or any(error["code"] != DUPLICATE_KEY for error in write_errors):
+                    raise
+                logger.warning("Skipped duplicate queued bookings",
+                               extra={"payload": {"count": len(write_errors)}})
+
+            # A worker that took over after our lock expired may have
+            # trimmed this head already; trimming again would drop bookings.
+            if not await refresh_lock(BOOKINGS_FLUSH_LOCK, lock_token, FLUSH_LOCK_TTL):
+                logger.warning("Lost the booking flush lock", extra={"payload": {"flushed": flushed}})
+                break
+            # Only drop the queue head once it is safely in Mongo.
+            await redis_call(redis_client.ltrim, BOOKINGS_PENDING, len(queued), -1, idempotent=True)
+            flushed += len(queued)
+    finally:
+        await release_lock(BOOKINGS_FLUSH_LOCK, lock_token)
+
+    return flushed
+
+async def run_booking_flusher():
+    """
+    Keep flushing queued bookings to Mongo.
+    """
+    while True:
+        try:
+            await flush_bookings()
+        except Exception:
+            logger.exception("Error flushing bookings")
+        await asyncio.sleep(FLUSH_INTERVAL)
@@ -1,27 +1,62 @@
 """
 Handle events.
 """
+import csv
+import io
+import json
+import time
+from datetime import datetime
 from bson import ObjectId
 from uuid import uuid4
 from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
 from pymongo import ReturnDocument
 
 from app.db.mongo_client import users_collection
+from app.db.resilience import mongo_call
 from app.schemas.events.event_requests import IncomingEventSchema, IncomingEventUpdate
+from app.utils.events_utils import index_event, unindex_event, query_event_index, event_timestamp
+from app.utils.search_utils import build_search_query, search_event_index, search_cache_key
+from app.utils.search_utils import get_cached_search, cache_search
+from app.utils.booking_utils import set_booking_event, drop_booking_event
+from app.services.stats_services import apply_event_stats
+from app.utils.sync_utils import record_event_change
+from app.utils.push_utils import publish_event_change
+from app.utils.version_utils import invalidate_versions, advance_version, user_version_key, event_version_key
+from app.utils.logging_utils import get_logger
 
 
+logger = get_logger(__name__)
+
+async def apply_derived_updates(user_id: str, event_id: str, updates: list):
+    """
+    Run the (name, awaitable) updates that follow a committed event write.
+    The event is already stored, so a failure is logged rather than failing
+    the request and inviting a retry that would write it again.
+    """
+    for name, update in updates:
+        try:
+            await update
+        except Exception:
+            logger.exception("Derived event update failed",
+                             extra={"msg_type": "event.derived_update_failed",
+                                    "payload": {"step": name, "user_id": user_id, "event_id": event_id}})
+
 async def add_event(user_id: str, event: IncomingEventSchema) -> dict:
     """
     Adds events.
     """
     event_id = str(uuid4())
     event_obj = event.model_dump()
-    event_obj["date"] = str(event_obj["date"])
-    updated_document = await users_collection.find_one_and_update(
+    event_obj["version"] = 1
+    await invalidate_versions(user_version_key(user_id))
+    updated_document = await mongo_call(
+        users_collection.find_one_and_update,
         {"_id": ObjectId(user_id)},
-        {"$set": {f"events.{event_id}": event_obj}},
+        {"$set": {f"events.{event_id}": event_obj}, "$inc": {"version": 1}},
         return_document=ReturnDocument.AFTER,  # Return the document after the update
-        projection={f"events.{event_id}": 1, "_id": 0}  # Project only the updated event
+        projection={f"events.{event_id}": 1, "version": 1, "_id": 0},  # Project only the updated event
+        idempotent=False  # A retried $inc would bump the version twice
     )
 
     if not updated_document:
@@ -31,13 +66,26 @@ async def add_event(user_id: str, event: IncomingEventSchema) -> dict:
     
     event_obj = updated_document.get("events", {}).get(event_id)
     event_obj["event_id"] = event_id
-    print("Event Object ", event_obj)
+    logger.info("Stored event", extra={"msg_type": "event.stored",
+                                       "payload": {"event_id": event_id, "user_id": user_id}})
+    # The change log is how /sync and SSE clients learn of the write, so it comes first.
+    sequence = await record_event_change(user_id, event_id)
+    await advance_version(user_version_key(user_id), updated_document["version"])
+    await advance_version(event_version_key(event_id), event_obj["version"])
+    await apply_derived_updates(user_id, event_id, [
+        ("index", index_event(user_id, event_id, event_obj)),
+        ("booking", set_booking_event(event_id, user_id, event_obj, only_if_loaded=False)),
+        ("stats", apply_event_stats(user_id, after=event_obj)),
+        ("publish", publish_event_change(sequence, user_id, event_id, "created", event_obj)),
+    ])
 
     return updated_document.get("events", {}).get(event_id)
 
-async def update_event(user_id: str, event_id: str, event: IncomingEventUpdate) -> dict:
+async def update_event(user_id: str, event_id: str, event: IncomingEventUpdate,
+                       expected_version: int = None) -> dict:
     """
-    Update an event.
+    Update an event. With `expected_version` the update only applies if the
+    event is still at that version.
     """
     event_update = event.model_dump()
 
@@ -49,21 +97,51 @@ async def update_event(user_id: str, event_id: str, event: IncomingEventUpdate)
             detail="No valid fields to update."
             )
 
-    # Perform the update in MongoDB
-    updated_document = await users_collection.find_one_and_update(
-        {"_id": ObjectId(user_id), f"events.{event_id}": {"$exists": True}},
-        {"$set": update_fields},
-        return_document=ReturnDocument.AFTER,  # Return the document after the update
-        projection={f"events.{event_id}": 1, "_id": 0}  # Project only the updated event
+    event_filter = {"_id": ObjectId(user_id), f"events.{event_id}": {"$exists": True}}
+    if expected_version is not None:
+        # Events written before versioning count as version 0.
+        event_filter[f"events.{event_id}.version"] = expected_version or {"$in": [0, None]}
+
+    await invalidate_versions(user_version_key(user_id), event_version_key(event_id))
+    # Perform the update in MongoDB, keeping the old event for the stats delta
+    previous_document = await mongo_call(
+        users_collection.find_one_and_update,
+        event_filter,
+        {"$set": update_fields, "$inc": {f"events.{event_id}.version": 1, "version": 1}},
+        return_document=ReturnDocument.BEFORE,  # Return the document before the update
+        projection={f"events.{event_id}": 1, "version": 1, "_id": 0},  # Project only the updated event
+        idempotent=False  # A retry would bump the versions twice and lose the BEFORE snapshot
     )
 
-    if not updated_document:
+    if not previous_document:
+        if expected_version is not None and await mongo_call(
+                users_collection.find_one,
+                {"_id": ObjectId(user_id), f"events.{event_id}": {"$exists": True}},
+                {"_id": 1},
+                idempotent=True):
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Event has changed.")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User or event not found.")
-    
-    event_obj = updated_document.get("events", {}).get(event_id)
+
+    previous_event = previous_document.get("events", {}).get(event_id)
+    event_obj = dict(previous_event)
+    event_obj.update({key: value for key, value in event_update.items() if value is not None})
+    event_obj["version"] = previous_event.get("version", 0) + 1
     event_obj["event_id"] = event_id
+    sequence = await record_event_change(user_id, event_id)
+    await advance_version(user_version_key(user_id), previous_document.get("version", 0) + 1)
+    await advance_version(event_version_key(event_id), event_obj["version"])
+    cancelled = event_obj.get("status") == "cancelled" and previous_event.get("status") != "cancelled"
+    await apply_derived_updates(user_id, event_id, [
+        ("index", index_event(user_id, event_id, event_obj)),
+        ("booking", set_booking_event(event_id, user_id, event_obj)),
+        ("stats", apply_event_stats(user_id, before=previous_event, after=event_obj)),
+        ("publish", publish_event_change(sequence, user_id, event_id,
+                                         "cancelled" if cancelled else "updated", event_obj)),
+    ])
 
     return event_obj
 
@@ -71,17 +149,155 @@ async def delete_event(user_id: str, event_id: str):
     """
     Delete an event.
     """
-    # Use $unset to remove the event from the events dictionary
-    result = await users_collection.update_one(
+    # Use $unset to remove the event from the events dictionary,
+    # getting the removed event back for the stats delta
+    await invalidate_versions(user_version_key(user_id), event_version_key(event_id))
+    previous_document = await mongo_call(
+        users_collection.find_one_and_update,
         {"_id": ObjectId(user_id)},
-        {"$unset": {f"events.{event_id}": ""}}
+        {"$unset": {f"events.{event_id}": ""}, "$inc": {"version": 1}},
+        return_document=ReturnDocument.BEFORE,
+        projection={f"events.{event_id}": 1, "version": 1, "_id": 0}
     )
 
-    if result.matched_count == 0:
+    if previous_document is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found.")
-    if result.modified_count == 0:
+    previous_event = previous_document.get("events", {}).get(event_id)
+    if not previous_event:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Event not found or already deleted.")
+    sequence = await record_event_change(user_id, event_id, deleted=True)
+    await advance_version(user_version_key(user_id), previous_document.get("version", 0) + 1)
+    await apply_derived_updates(user_id, event_id, [
+        # Dropped again in case a reader cached the event's version during the write.
+        ("version", invalidate_versions(event_version_key(event_id))),
+        ("index", unindex_event(user_id, event_id)),
+        ("booking", drop_booking_event(event_id)),
+        ("stats", apply_event_stats(user_id, before=previous_event)),
+        ("publish", publish_event_change(sequence, user_id, event_id, "deleted")),
+    ])
+
+async def list_events(event_status: str = "active",
+                      start: datetime = None,
+                      end: datetime = None,
+                      limit: int = 20,
+                      cursor: str = None,
+                      group_id: str = None) -> dict:
+    """
+    List events in date order from the time index.
+    Without `start` only upcoming events are returned.
+    """
+    start_ts = event_timestamp(start) if start else time.time()
+    end_ts = event_timestamp(end) if end else float("inf")
+    entries, next_cursor = await query_event_index(event_status, start_ts, end_ts, limit,
+                                                   cursor=cursor, user_id=group_id)
+    events = await fetch_events(entries)
+    return {"events": events, "next_cursor": next_cursor}
+
+async def search_events(text: str,
+                        event_status: str = None,
+                        start: datetime = None,
+                        end: datetime = None,
+                        page: int = 1,
+                        limit: int = 20) -> dict:
+    """
+    Search events by keyword over title, description and location,
+    best match first. Hot queries take their matches from a short-lived
+    cache; the events themselves are always read fresh, so edits and
+    deletions show at once and only new matches can lag.
+    """
+    if page < 1:
+        raise HTTPException(status_code=400, detail="Page number must be 1 or greater.")
+
+    start_ts = event_timestamp(start) if start else None
+    end_ts = event_timestamp(end) if end else None
+    params = {"text": text, "status": event_status, "start": start_ts, "end": end_ts,
+              "page": page, "limit": limit}
+
+    cache_key = search_cache_key(params)
+    cached = await get_cached_search(cache_key)
+    if cached:
+        total, entries = cached
+    else:
+        query = build_search_query(text, event_status, start_ts, end_ts)
+        total, entries = await search_event_index(query, (page - 1) * limit, limit)
+        await cache_search(cache_key, total, entries)
+
+    events = await fetch_events(entries)
+    return jsonable_encoder({"page": page, "limit": limit, "total": total, "events": events})
+
+async def fetch_events(entries: list) -> list:
+    """
+    Load the events for (user_id, event_id) pairs, keeping their order.
+    """
+    if not entries:
+        return []
+
+    # One round trip for all the groups on this page, projecting only the listed events.
+    user_ids = list({ObjectId(user_id) for user_id, _ in entries})
+    projection = {f"events.{event_id}": 1 for _, event_id in entries}
+    documents = await mongo_call(
+        lambda: users_collection.find({"_id": {"$in": user_ids}}, projection).to_list(length=None),
+        idempotent=True
+    )
+    events_by_user = {str(doc["_id"]): doc.get("events", {}) for doc in documents}
+
+    events = []
+    for user_id, event_id in entries:
+        event_obj = events_by_user.get(user_id, {}).get(event_id)
+        if not event_obj:  # Deleted between the index read and the fetch.
+            continue
+        event_obj["event_id"] = event_id
+        event_obj["group_id"] = user_id
+        events.append(event_obj)
+
+    return events
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_FIELDS = ["event_id", "title", "description", "location", "date", "status",
+                 "fee", "support_contact", "after_booking_message", "capacity"]
+
+async def export_events(user_id: str, export_format: str = "ndjson", cursor: str = None):
+    """
+    Stream a user's events as NDJSON or CSV chunks, ordered by event ID.
+
+    Events are unwound on the server and read in fixed-size batches, so
+    memory stays flat however many events the user has. `cursor` is the
+    last event ID a previous export delivered; the export resumes after it.
+    """
+    pipeline = [
+        {"$match": {"_id": ObjectId(user_id)}},
+        {"$project": {"_id": 0, "event": {"$objectToArray": {"$ifNull": ["$events", {}]}}}},
+        {"$unwind": "$event"},
+    ]
+    if cursor:
+        pipeline.append({"$match": {"event.k": {"$gt": cursor}}})
+    pipeline.append({"$sort": {"event.k": 1}})
+
+    events_cursor = users_collection.aggregate(pipeline, allowDiskUse=True, batchSize=EXPORT_BATCH_SIZE)
+
+    if export_format == "csv" and not cursor:
+        yield ",".join(EXPORT_FIELDS) + "\r\n"
+
+    while True:
+        batch = await mongo_call(events_cursor.to_list, length=EXPORT_BATCH_SIZE)
+        if not batch:
+            break
+
+        rows = []
+        for item in batch:
+            event_obj = item["event"]["v"]
+            event_obj["event_id"] = item["event"]["k"]
+            rows.append(jsonable_encoder(event_obj))
+
+        # Each yield waits for the client to take the previous chunk.
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+            writer.writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield "".join(json.dumps(row) + "\n" for row in rows)
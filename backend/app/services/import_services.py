@@ -0,0 +1,323 @@
+"""
+Bulk import of events from CSV or NDJSON uploads.
+
+Uploads are streamed to disk, then parsed, validated and written in chunks
+by a background job whose progress is kept in Redis. Event IDs are derived
+from the job ID and row number, so re-running a chunk after a crash
+overwrites instead of duplicating and a job can be resumed safely.
+
+Events are stored in the organizer's user document, so an upload is
+refused up front if it would push that document past Mongo's 16 MB limit.
+"""
+import asyncio
+import csv
+import json
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from pymongo import ReturnDocument
+
+from app.db.mongo_client import users_collection
+from app.db.redis_client import redis_client
+from app.db.resilience import mongo_call, redis_call
+from app.schemas.events.event_requests import IncomingEventSchema
+from app.utils.events_utils import index_event
+from app.utils.sync_utils import record_event_change
+from app.utils.push_utils import publish_event_change
+from app.utils.lock_utils import acquire_lock, refresh_lock, release_lock
+from app.utils.version_utils import invalidate_versions, advance_version, user_version_key
+from app.services.stats_services import recompute_user_stats
+from app.services.events_services import apply_derived_updates
+
+
+IMPORTS_DIR = Path("~/TIZI-imports/").expanduser()
+IMPORT_FORMATS = ("csv", "ndjson")
+# Request body types an upload's format is taken from when not given.
+IMPORT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+}
+IMPORT_CHUNK_ROWS = 500
+IMPORT_JOB_TTL = 7 * 24 * 60 * 60
+MAX_REPORTED_ERRORS = 1000
+IMPORT_LOCK_TTL = 60
+# Room left under Mongo's 16 MB document limit for the organizer's other writes.
+MAX_USER_DOCUMENT_BYTES = 15 * 1024 * 1024
+# BSON bytes an event takes beyond its raw text: its ID key, field names and types.
+IMPORT_ROW_OVERHEAD = 256
+# Fields an empty CSV cell leaves unset; the export writes their None as an empty cell.
+OPTIONAL_EVENT_FIELDS = {name for name, field in IncomingEventSchema.model_fields.items()
+                         if not field.is_required()}
+
+def import_job_key(job_id: str) -> str:
+    """
+    Redis key of an import job's state.
+    """
+    return f"import:{job_id}"
+
+def import_errors_key(job_id: str) -> str:
+    """
+    Redis key of an import job's row errors.
+    """
+    return f"import:{job_id}:errors"
+
+def import_lock_key(job_id: str) -> str:
+    """
+    Redis key held by the worker running an import job.
+    """
+    return f"import:{job_id}:lock"
+
+def import_file_path(job_id: str, import_format: str) -> Path:
+    """
+    Where an upload is kept while it is being imported.
+    """
+    return IMPORTS_DIR / f"{job_id}.{import_format}"
+
+async def get_user_document_size(user_id: str) -> int:
+    """
+    Current BSON size of a user's document.
+    """
+    documents = await mongo_call(
+        lambda: users_collection.aggregate([
+            {"$match": {"_id": ObjectId(user_id)}},
+            {"$project": {"_id": 0, "size": {"$bsonSize": "$$ROOT"}}},
+        ]).to_list(length=1),
+        idempotent=True
+    )
+    if not documents:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="User not found.")
+    return documents[0]["size"]
+
+def import_too_large() -> HTTPException:
+    """
+    The error for an upload that would not fit in the user's document.
+    """
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Import too large: an organizer's events must fit in "
+               f"{MAX_USER_DOCUMENT_BYTES // (1024 * 1024)} MB. Split the file or remove events.")
+
+async def create_import_job(user_id: str, chunks: AsyncIterator[bytes], import_format: str,
+                            content_length: int = None) -> str:
+    """
+    Stream an upload to disk and register an import job for it.
+    Uploads that would not fit in the user's document are refused, from
+    Content-Length when given and otherwise as the bytes arrive.
+    """
+    available = MAX_USER_DOCUMENT_BYTES - await get_user_document_size(user_id)
+    if content_length is not None and content_length > available:
+        raise import_too_large()
+
+    await asyncio.to_thread(IMPORTS_DIR.mkdir, parents=True, exist_ok=True)
+    job_id = str(uuid.uuid4())
+    path = import_file_path(job_id, import_format)
+
+    # Rough BSON size of the imported events, counted as the upload arrives.
+    estimated_size = 0
+    try:
+        with open(path, "wb") as destination:
+            async for chunk in chunks:
+                estimated_size += len(chunk) + chunk.count(b"\n") * IMPORT_ROW_OVERHEAD
+                if estimated_size > available:
+                    raise import_too_large()
+                await asyncio.to_thread(destination.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+    await redis_call(redis_client.hset, import_job_key(job_id), mapping={
+        "user_id": user_id,
+        "format": import_format,
+        "status": "pending",
+        "rows_processed": 0,
+        "rows_imported": 0,
+        "rows_failed": 0,
+    }, idempotent=True)
+    await redis_call(redis_client.expire, import_job_key(job_id), IMPORT_JOB_TTL, idempotent=True)
+    return job_id
+
+async def get_import_job(job_id: str, user_id: str, errors_limit: int = 100) -> dict:
+    """
+    Progress and first row errors of a user's import job.
+    """
+    job = await redis_call(redis_client.hgetall, import_job_key(job_id), idempotent=True)
+    job = {key.decode("utf-8"): value.decode("utf-8") for key, value in job.items()}
+    if not job or job.get("user_id") != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Import job not found.")
+
+    row_errors = await redis_call(redis_client.lrange, import_errors_key(job_id), 0, errors_limit - 1,
+                                  idempotent=True)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "format": job["format"],
+        "rows_processed": int(job["rows_processed"]),
+        "rows_imported": int(job["rows_imported"]),
+        "rows_failed": int(job["rows_failed"]),
+        "detail": job.get("detail"),
+        "errors": [json.loads(error) for error in row_errors],
+    }
+
+def parse_row(import_format: str, raw) -> dict:
+    """
+    Turn a raw CSV row or NDJSON line into a dict.
+    """
+    if import_format == "csv":
+        return {key: None if value == "" and key in OPTIONAL_EVENT_FIELDS else value
+                for key, value in raw.items()}
+    return json.loads(raw)
+
+def read_rows(handle, import_format: str, size: int) -> list:
+    """
+    Read up to `size` raw rows, skipping blank NDJSON lines.
+    """
+    rows = []
+    for raw in handle:
+        if import_format == "ndjson" and not raw.strip():
+            continue
+        rows.append(raw)
+        if len(rows) == size:
+            break
+    return rows
+
+def skip_rows(handle, import_format: str, count: int):
+    """
+    Advance past `count` raw rows without keeping them.
+    """
+    skipped = 0
+    while skipped < count:
+        raw = next(handle, None)
+        if raw is None:
+            return
+        if import_format == "ndjson" and not raw.strip():
+            continue
+        skipped += 1
+
+async def run_import_job(job_id: str):
+    """
+    Import an uploaded file chunk by chunk, resuming after the last
+    committed chunk. Only one worker runs a job at a time.
+    """
+    lock_key = import_lock_key(job_id)
+    lock_token = await acquire_lock(lock_key, IMPORT_LOCK_TTL)
+    if not lock_token:
+        return
+    job_key = import_job_key(job_id)
+
+    try:
+        job = await redis_call(redis_client.hgetall, job_key, idempotent=True)
+        job = {key.decode("utf-8"): value.decode("utf-8") for key, value in job.items()}
+        user_id = job["user_id"]
+        import_format = job["format"]
+        rows_processed = int(job["rows_processed"])
+        await redis_call(redis_client.hset, job_key, "status", "running", idempotent=True)
+
+        path = import_file_path(job_id, import_format)
+        with open(path, "r", encoding="utf-8", newline="") as source:
+            handle = csv.DictReader(source) if import_format == "csv" else source
+
+            # Skip what earlier runs already committed.
+            await asyncio.to_thread(skip_rows, handle, import_format, rows_processed)
+
+            while True:
+                raw_rows = await asyncio.to_thread(read_rows, handle, import_format, IMPORT_CHUNK_ROWS)
+                if not raw_rows:
+                    break
+                await import_chunk(job_id, user_id, import_format, raw_rows, rows_processed)
+                rows_processed += len(raw_rows)
+                if not await refresh_lock(lock_key, lock_token, IMPORT_LOCK_TTL):
+                    # Our lock expired and another worker resumed the job.
+                    return
+
+        # Replayed chunks would double count deltas, so rebuild the stats once instead.
+        await recompute_user_stats(user_id)
+        await redis_call(redis_client.hset, job_key, "status", "completed", idempotent=True)
+        path.unlink(missing_ok=True)
+    except Exception as exc:
+        await redis_call(redis_client.hset, job_key, mapping={"status": "failed", "detail": str(exc)},
+                         idempotent=True)
+    finally:
+        await release_lock(lock_key, lock_token)
+
+async def import_chunk(job_id: str, user_id: str, import_format: str, raw_rows: list, first_row: int):
+    """
+    Validate a chunk of rows and write the valid ones in a single update.
+    """
+    events = {}
+    row_errors = []
+    for row_number, raw in enumerate(raw_rows, start=first_row + 1):
+        try:
+            event = IncomingEventSchema(**parse_row(import_format, raw))
+        except json.JSONDecodeError as exc:
+            row_errors.append({"row": row_number, "errors": [{"loc": [], "msg": str(exc)}]})
+            continue
+        except (ValidationError, TypeError) as exc:
+            details = exc.errors(include_url=False) if isinstance(exc, ValidationError) else [{"msg": str(exc)}]
+            row_errors.append({"row": row_number, "errors": [
+                {"loc": list(detail.get("loc", [])), "msg": detail["msg"]} for detail in details
+            ]})
+            continue
+        event_id = str(uuid.uuid5(uuid.UUID(job_id), str(row_number)))
+        events[event_id] = event.model_dump()
+        events[event_id]["version"] = 1
+
+    if events:
+        # Events live in the user's document, so one $set writes the whole chunk.
+        await invalidate_versions(user_version_key(user_id))
+        updated_document = await mongo_call(
+            users_collection.find_one_and_update,
+            {"_id": ObjectId(user_id)},
+            {"$set": {f"events.{event_id}": event for event_id, event in events.items()},
+             "$inc": {"version": 1}},
+            projection={"version": 1},
+            return_document=ReturnDocument.AFTER,
+            idempotent=False  # A retried $inc would bump the version twice; resuming replays the chunk
+        )
+        if not updated_document:
+            raise RuntimeError("User not found.")
+        await advance_version(user_version_key(user_id), updated_document["version"])
+        for event_id, event in events.items():
+            await index_event(user_id, event_id, event)
+            sequence = await record_event_change(user_id, event_id)
+            await apply_derived_updates(user_id, event_id, [
+                ("publish", publish_event_change(sequence, user_id, event_id, "created",
+                                                 {**event, "event_id": event_id})),
+            ])
+
+    job_key = import_job_key(job_id)
+    errors_key = import_errors_key(job_id)
+
+    async def record_progress():
+        pipe = redis_client.pipeline(transaction=True)
+        for row_error in row_errors:
+            pipe.rpush(errors_key, json.dumps(row_error))
+        pipe.ltrim(errors_key, 0, MAX_REPORTED_ERRORS - 1)
+        pipe.expire(errors_key, IMPORT_JOB_TTL)
+        pipe.hincrby(job_key, "rows_imported", len(events))
+        pipe.hincrby(job_key, "rows_failed", len(row_errors))
+        pipe.hset(job_key, "rows_processed", first_row + len(raw_rows))
+        return await pipe.execute()
+
+    await redis_call(record_progress)
+
+async def resume_import_job(job_id: str, user_id: str) -> dict:
+    """
+    Check that a failed or interrupted job can be resumed.
+    """
+    job = await get_import_job(job_id, user_id, errors_limit=1)
+    if job["status"] == "completed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Import job already completed.")
+    if await redis_call(redis_client.exists, import_lock_key(job_id), idempotent=True):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Import job is already running.")
+    if not import_file_path(job_id, job["format"]).exists():
+        raise HTTPException(status_code=status.HTTP_410_GONE,
+                            detail="Uploaded file is no longer available.")
+    return job
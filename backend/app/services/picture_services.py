@@ -0,0 +1,223 @@
+"""
+Profile pictures.
+
+Uploads are sent as the raw request body, which is streamed to disk and
+hashed as it arrives, so the size cap bounds what the server accepts and
+the file is written once. Pictures are then stored under their SHA-256
+digest, so the same picture uploaded twice (by anyone) is kept once.
+Thumbnails are generated in a process pool and stored next to the
+originals under the same digest.
+
+Since a digest never changes content, served files are cached forever by
+clients and their file metadata is kept in a small in-process LRU.
+Thumbnail sizes missing on disk are generated on first request, once per
+size however many requests arrive for it meanwhile.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from bson import ObjectId
+from typing import AsyncIterator
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+
+from app.db.mongo_client import users_collection
+from app.db.resilience import mongo_call
+from app.utils.user_utils import PICTURES_DIR, ALLOWED_PIC_EXTENSIONS
+from app.utils.picture_utils import THUMBNAIL_SIZES, sniff_picture_type, generate_thumbnails
+from app.utils.sync_utils import record_user_change
+from app.utils.version_utils import invalidate_versions, advance_version, user_version_key
+
+
+PICTURE_SNIFF_BYTES = 8
+MAX_PICTURE_BYTES = 10 * 1024 * 1024
+PICTURE_METADATA_CACHE_SIZE = 1024
+PICTURE_MEDIA_TYPES = {"png": "image/png", "jpg": "image/jpeg"}
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+# (digest, type, size) -> (path, stat result) of recently served files, oldest first.
+picture_metadata = OrderedDict()
+# Thumbnails being generated on demand, so concurrent requests share one job.
+pending_thumbnails = {}
+
+def picture_path(digest: str, picture_type: str) -> Path:
+    """
+    Where an original picture is stored.
+    """
+    return PICTURES_DIR / "original" / digest[:2] / f"{digest}.{picture_type}"
+
+def thumbnail_path(digest: str, picture_type: str, size: int) -> Path:
+    """
+    Where a picture's thumbnail of a given size is stored.
+    """
+    return PICTURES_DIR / "thumbs" / str(size) / digest[:2] / f"{digest}.{picture_type}"
+
+def write_chunk(destination, hasher, chunk: bytes):
+    """
+    Write and hash one chunk of an upload.
+    """
+    destination.write(chunk)
+    hasher.update(chunk)
+
+async def receive_picture(chunks: AsyncIterator[bytes], content_length: int = None) -> tuple:
+    """
+    Stream an upload to a temporary file, checking its type and size.
+    Returns the file's path, digest and picture type.
+    """
+    if content_length is not None and content_length > MAX_PICTURE_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Picture is too large.")
+
+    incoming_dir = PICTURES_DIR / "incoming"
+    await asyncio.to_thread(incoming_dir.mkdir, parents=True, exist_ok=True)
+    path = incoming_dir / uuid.uuid4().hex
+    hasher = hashlib.sha256()
+    picture_type = None
+    size = 0
+    # Bytes held back until there are enough to recognise the format.
+    pending = b""
+
+    try:
+        with open(path, "wb") as destination:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > MAX_PICTURE_BYTES:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                        detail="Picture is too large.")
+                if picture_type is None:
+                    pending += chunk
+                    if len(pending) < PICTURE_SNIFF_BYTES:
+                        continue
+                    picture_type = sniff_picture_type(pending)
+                    if picture_type not in ALLOWED_PIC_EXTENSIONS:
+                        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                            detail="Picture must be a PNG or JPEG image.")
+                    chunk, pending = pending, b""
+                if chunk:
+                    await asyncio.to_thread(write_chunk, destination, hasher, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+    if picture_type is None:
+        path.unlink(missing_ok=True)
+        if pending:  # Too short to be a picture at all.
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                detail="Picture must be a PNG or JPEG image.")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Picture is empty.")
+    return path, hasher.hexdigest(), picture_type
+
+async def store_picture(chunks: AsyncIterator[bytes], content_length: int = None) -> tuple:
+    """
+    Store an uploaded picture and its thumbnails, reusing them if the
+    same picture was stored before. Returns its digest and type.
+    """
+    path, digest, picture_type = await receive_picture(chunks, content_length)
+    try:
+        original = picture_path(digest, picture_type)
+        known = original.exists()
+        missing = {size: str(thumbnail_path(digest, picture_type, size))
+                   for size in THUMBNAIL_SIZES if not thumbnail_path(digest, picture_type, size).exists()}
+
+        # A new picture is always decoded once, which also rejects files
+        # that only look like images.
+        if missing or not known:
+            try:
+                await generate_thumbnails(str(original if known else path), picture_type, missing)
+            except (ValueError, OSError) as exc:
+                raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                    detail="Picture could not be decoded.") from exc
+        if not known:
+            await asyncio.to_thread(original.parent.mkdir, parents=True, exist_ok=True)
+            os.replace(path, original)
+    finally:
+        path.unlink(missing_ok=True)
+
+    return digest, picture_type
+
+async def update_profile_picture(user_id: str, chunks: AsyncIterator[bytes], content_length: int = None) -> dict:
+    """
+    Set a user's profile picture from an uploaded body.
+    The previous picture's files are kept, since other users may share them.
+    """
+    digest, picture_type = await store_picture(chunks, content_length)
+    picture = {"hash": digest, "type": picture_type}
+
+    await invalidate_versions(user_version_key(user_id))
+    updated_document = await mongo_call(
+        users_collection.find_one_and_update,
+        {"_id": ObjectId(user_id)},
+        {"$set": {"picture": picture}, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER,
+        projection={"version": 1, "_id": 0},
+        idempotent=False  # A retried $inc would bump the version twice
+    )
+
+    if not updated_document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found.")
+
+    await advance_version(user_version_key(user_id), updated_document["version"])
+    await record_user_change(user_id)
+    return {**picture, "sizes": list(THUMBNAIL_SIZES)}
+
+def picture_etag(digest: str, size: int = None) -> str:
+    """
+    Strong ETag of a stored picture or one of its thumbnails.
+    """
+    return f'"p-{digest}-{size or "original"}"'
+
+async def generate_missing_thumbnail(digest: str, picture_type: str, size: int):
+    """
+    Generate one thumbnail from the stored original, sharing the work
+    with any concurrent request for the same thumbnail.
+    """
+    key = (digest, picture_type, size)
+    task = pending_thumbnails.get(key)
+    if task is None:
+        destination = {size: str(thumbnail_path(digest, picture_type, size))}
+        source = str(picture_path(digest, picture_type))
+        task = asyncio.ensure_future(generate_thumbnails(source, picture_type, destination))
+        pending_thumbnails[key] = task
+        task.add_done_callback(lambda _: pending_thumbnails.pop(key, None))
+    # Shielded, so a client going away does not cancel it for the others.
+    await asyncio.shield(task)
+
+async def get_picture_file(digest: str, picture_type: str, size: int = None) -> tuple:
+    """
+    Path and stat result of a stored picture, or of its thumbnail if
+    `size` is given.
+    """
+    if not DIGEST_PATTERN.fullmatch(digest) or picture_type not in PICTURE_MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Picture not found.")
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}.")
+
+    key = (digest, picture_type, size)
+    cached = picture_metadata.get(key)
+    if cached:
+        picture_metadata.move_to_end(key)
+        return cached
+
+    path = picture_path(digest, picture_type) if size is None else thumbnail_path(digest, picture_type, size)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        if size is None or not picture_path(digest, picture_type).exists():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail="Picture not found.")
+        await generate_missing_thumbnail(digest, picture_type, size)
+        stat_result = await asyncio.to_thread(os.stat, path)
+
+    picture_metadata[key] = (path, stat_result)
+    if len(picture_metadata) > PICTURE_METADATA_CACHE_SIZE:
+        picture_metadata.popitem(last=False)
+    return path, stat_result
@@ -0,0 +1,87 @@
+"""
+Server-Sent Events feed of event changes.
+"""
+import asyncio
+import json
+
+from app.services.events_services import fetch_events
+from app.utils.push_utils import broadcaster
+from app.utils.sync_utils import read_changes, get_sync_position
+
+
+HEARTBEAT_INTERVAL = 15
+REPLAY_BATCH = 500
+
+def format_sse(message: dict) -> str:
+    """
+    Render a change as an SSE frame, using its sequence as the event ID.
+    """
+    return f"id: {message['seq']}\nevent: {message['op']}\ndata: {json.dumps(message)}\n\n"
+
+async def replay_changes(since: int, group_id: str = None):
+    """
+    Changes after `since` from the change log, for reconnecting clients.
+    A client older than the compacted floor may have missed deletions, so
+    it gets a single `reset` change telling it to fetch everything again,
+    as GET /sync does.
+    """
+    sequence, floor = await get_sync_position()
+    if since < floor or since > sequence:
+        yield {"seq": sequence, "op": "reset", "group_id": group_id, "event_id": None, "event": None}
+        return
+
+    while True:
+        changes, has_more = await read_changes(since, REPLAY_BATCH)
+        if not changes:
+            return
+        # Advance past the whole batch, even when no change in it is for this group.
+        since = changes[-1][0]
+        if group_id:
+            changes = [change for change in changes if change[1] == group_id]
+        upserted = [(change_group, event_id) for _, change_group, event_id, deleted in changes if not deleted]
+        events = {event["event_id"]: event for event in await fetch_events(upserted)}
+
+        for sequence, change_group, event_id, deleted in changes:
+            event = events.get(event_id)
+            operation = "deleted" if deleted or not event else "updated"
+            yield {"seq": sequence, "op": operation, "group_id": change_group,
+                   "event_id": event_id, "event": event}
+        if not has_more:
+            return
+
+async def stream_event_changes(group_id: str = None, last_event_id: int = None):
+    """
+    Push event changes to one client as SSE frames.
+
+    The client is subscribed before any replay, so nothing published in
+    between is lost; live changes the replay already covered are not sent
+    twice. Live changes can arrive out of sequence order, since sequences
+    are assigned before publishing, so only the replay is deduplicated. A client
+    that cannot keep up is told to reconnect, and resumes from the change
+    log with Last-Event-ID.
+    """
+    subscriber = broadcaster.subscribe(group_id)
+    try:
+        yield f"retry: {HEARTBEAT_INTERVAL * 1000}\n\n"
+
+        # The client has everything up to its Last-Event-ID and what is replayed.
+        replayed_up_to = last_event_id or 0
+        if last_event_id is not None:
+            async for message in replay_changes(last_event_id, group_id):
+                yield format_sse(message)
+                replayed_up_to = max(replayed_up_to, message["seq"])
+
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if message["seq"] <= replayed_up_to:
+                continue
+            yield format_sse(message)
+            if subscriber.overflowed and subscriber.queue.empty():
+                yield "event: reconnect\ndata: {}\n\n"
+                return
+    finally:
+        broadcaster.unsubscribe(subscriber)
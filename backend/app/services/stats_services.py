@@ -0,0 +1,125 @@
+"""
+Organizer analytics.
+
+Each organizer has one analytics document whose counters the event write
+paths move with $inc deltas, so reading stats is a single lookup.
+A full recompute from the events themselves corrects any drift.
+"""
+import time
+from datetime import datetime, timezone
+from bson import ObjectId
+
+from app.db.mongo_client import users_collection, analytics_collection
+from app.db.redis_client import redis_client
+from app.db.resilience import mongo_call, redis_call
+from app.utils.events_utils import event_time_index_key
+
+
+def event_stats(event: dict) -> dict:
+    """
+    What one event contributes to its organizer's counters.
+    """
+    if not event:
+        return {}
+    event_status = event.get("status")
+    fee = event.get("fee") or 0
+    capacity = event.get("capacity") or 0
+    return {
+        "events_total": 1,
+        f"by_status.{event_status}": 1,
+        "expected_revenue": fee * capacity if event_status == "active" else 0,
+    }
+
+async def apply_event_stats(user_id: str, before: dict = None, after: dict = None):
+    """
+    Move an organizer's counters from an event's old state to its new one.
+    Organizers without an analytics document yet get one built from all
+    their events, which already include this change.
+    """
+    delta = event_stats(after)
+    for key, value in event_stats(before).items():
+        delta[key] = delta.get(key, 0) - value
+    delta = {key: value for key, value in delta.items() if value}
+    if not delta:
+        return
+
+    result = await mongo_call(
+        analytics_collection.update_one,
+        {"_id": ObjectId(user_id)},
+        {"$inc": delta, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    )
+    if result.matched_count == 0:
+        # A delta alone would only count this event, not the ones before it.
+        await recompute_user_stats(user_id)
+
+def stats_pipeline(user_id: str) -> list:
+    """
+    Aggregation computing an organizer's counters from their events.
+    """
+    return [
+        {"$match": {"_id": ObjectId(user_id)}},
+        {"$project": {"event": {"$objectToArray": {"$ifNull": ["$events", {}]}}}},
+        {"$unwind": "$event"},
+        {"$group": {
+            "_id": "$event.v.status",
+            "count": {"$sum": 1},
+            "revenue": {"$sum": {"$multiply": [
+                {"$ifNull": ["$event.v.fee", 0]},
+                {"$ifNull": ["$event.v.capacity", 0]},
+            ]}},
+        }},
+    ]
+
+async def recompute_user_stats(user_id: str) -> dict:
+    """
+    Rebuild an organizer's counters from their events.
+    """
+    groups = await mongo_call(
+        lambda: users_collection.aggregate(stats_pipeline(user_id)).to_list(length=None),
+        idempotent=True
+    )
+
+    stats = {
+        "events_total": sum(group["count"] for group in groups),
+        "by_status": {group["_id"]: group["count"] for group in groups},
+        "expected_revenue": sum(group["revenue"] for group in groups if group["_id"] == "active"),
+        "updated_at": datetime.now(timezone.utc),
+    }
+    await mongo_call(
+        analytics_collection.replace_one,
+        {"_id": ObjectId(user_id)},
+        stats,
+        upsert=True,
+        idempotent=True
+    )
+    return stats
+
+async def get_user_stats(user_id: str) -> dict:
+    """
+    An organizer's dashboard stats. Upcoming and past counts come from the
+    events time index, since they change with the clock rather than with writes.
+    """
+    stats = await mongo_call(analytics_collection.find_one, {"_id": ObjectId(user_id)}, {"_id": 0},
+                             idempotent=True)
+    if not stats:
+        stats = await recompute_user_stats(user_id)
+
+    now = time.time()
+    active_key = event_time_index_key("active", user_id)
+    upcoming = await redis_call(redis_client.zcount, active_key, now, "+inf", idempotent=True)
+    past = await redis_call(redis_client.zcount, active_key, "-inf", f"({now}", idempotent=True)
+
+    return {
+        "events_total": stats.get("events_total", 0),
+        "by_status": stats.get("by_status", {}),
+        "upcoming": upcoming,
+        "past": past,
+        "expected_revenue": stats.get("expected_revenue", 0),
+        "updated_at": stats.get("updated_at"),
+    }
+
+async def delete_user_stats(user_id: str):
+    """
+    Remove an organizer's analytics document.
+    """
+    await mongo_call(analytics_collection.delete_one, {"_id": ObjectId(user_id)}, idempotent=True)
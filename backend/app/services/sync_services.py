@@ -0,0 +1,60 @@
+"""
+Delta sync for mobile clients.
+"""
+import asyncio
+from bson import ObjectId
+
+from app.db.mongo_client import users_collection
+from app.db.resilience import mongo_call
+from app.services.events_services import fetch_events
+from app.utils.sync_utils import read_changes, get_sync_position, get_user_change, compact_change_log
+from app.utils.logging_utils import get_logger
+
+
+logger = get_logger(__name__)
+
+async def get_changes(user_id: str, since: int = 0, limit: int = 500) -> dict:
+    """
+    Events created, updated or deleted after the `since` token, and the
+    user's profile if it changed. Clients whose token predates compaction
+    get `reset` and must fetch everything again.
+    """
+    sequence, floor = await get_sync_position()
+    if since < floor or since > sequence:
+        return {"reset": True, "next_token": str(sequence), "has_more": False,
+                "events": [], "deleted": [], "user": None}
+
+    changes, has_more = await read_changes(since, limit)
+
+    upserted = [(group_id, event_id) for _, group_id, event_id, deleted in changes if not deleted]
+    events = await fetch_events(upserted)
+
+    # Events whose group was removed are gone too, even without a tombstone.
+    fetched = {(event["group_id"], event["event_id"]) for event in events}
+    deleted = [{"group_id": group_id, "event_id": event_id}
+               for _, group_id, event_id, is_deleted in changes
+               if is_deleted or (group_id, event_id) not in fetched]
+
+    user = None
+    if await get_user_change(user_id) > since:
+        user = await mongo_call(users_collection.find_one, {"_id": ObjectId(user_id)}, {"events": 0},
+                                idempotent=True)
+        if user:
+            user["user_id"] = str(user.pop("_id"))
+
+    # Changes up to `sequence` were all visible before the read, so a
+    # complete read can move the token that far.
+    next_token = changes[-1][0] if has_more else max(sequence, since)
+    return {"reset": False, "next_token": str(next_token), "has_more": has_more,
+            "events": events, "deleted": deleted, "user": user}
+
+async def run_change_log_compactor(interval: int = 3600):
+    """
+    Keep the change log bounded by compacting it periodically.
+    """
+    while True:
+        try:
+            await compact_change_log()
+        except Exception:
+            logger.exception("Error compacting change log")
+        await asyncio.sleep(interval)
@@ -1,15 +1,20 @@
 from bson import ObjectId, errors
 from fastapi import HTTPException, status
 from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from app.db.mongo_client import users_collection
+from app.db.resilience import mongo_call, DatastoreUnavailable
 from app.utils.user_utils import add_username_to_bloom_filter, username_is_available
+from app.services.stats_services import delete_user_stats
+from app.utils.sync_utils import record_user_change
+from app.utils.version_utils import invalidate_versions, advance_version, user_version_key
 
 
 async def find_user_by_email(email: str) -> dict:
     """
     Retrieves a user associated with given email.
     """
-    user = await users_collection.find_one({"email": email})
+    user = await mongo_call(users_collection.find_one, {"email": email}, idempotent=True)
     if not user:
         return None
     user["_id"] = str(user["_id"])
@@ -20,14 +25,21 @@ async def create_user(user: dict) -> str:
     Adds a user to the database.
     """
     username = user.get("username")
-    if not username_is_available(username):
+    if not await username_is_available(username):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Username already in use."
         )
-    add_username_to_bloom_filter(username)
+    await add_username_to_bloom_filter(username)
 
-    result = await users_collection.insert_one(user)
+    try:
+        result = await mongo_call(users_collection.insert_one, user)
+    except DuplicateKeyError as exc:
+        field = "Username" if "username" in (exc.details or {}).get("keyPattern", {}) else "Email"
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{field} already in use."
+        ) from exc
     user["_id"] = str(result.inserted_id)
 
     return str(result.inserted_id)
@@ -36,18 +48,28 @@ async def update_username(user_id: str, username: str) -> dict:
     """
     Updates username.
     """
-    updated_document = await users_collection.find_one_and_update(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"username": username}},
-        return_document=ReturnDocument.AFTER,  # Return the document after the update
-        projection={username: 1, "_id": 0}  # Project only the updated event
-    )
+    await invalidate_versions(user_version_key(user_id))
+    try:
+        updated_document = await mongo_call(
+            users_collection.find_one_and_update,
+            {"_id": ObjectId(user_id)},
+            {"$set": {"username": username}, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER,  # Return the document after the update
+            projection={"username": 1, "version": 1, "_id": 0},  # Project only the updated fields
+            idempotent=False  # A retried $inc would bump the version twice
+        )
+    except DuplicateKeyError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Username already in use.") from exc
 
     if not updated_document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found.")
 
+    await advance_version(user_version_key(user_id), updated_document["version"])
+    await record_user_change(user_id)
     return updated_document
 
 async def find_user_by_id(user_id: str) -> dict:
@@ -55,18 +77,31 @@ async def find_user_by_id(user_id: str) -> dict:
     Retrieves a user by their ID.
     """
     try:
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await mongo_call(users_collection.find_one, {"_id": ObjectId(user_id)}, idempotent=True)
         if not user:
             return None
         user["_id"] = str(user["_id"])
     except errors.InvalidId as exc:
         raise HTTPException(status_code=400, detail="Invalid post ID") from exc
+    except DatastoreUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error occurred: {e}") from e
     return user
 
+async def user_exists(user_id: str) -> bool:
+    """
+    Checks that a user exists without loading their document.
+    """
+    try:
+        user = await mongo_call(users_collection.find_one, {"_id": ObjectId(user_id)}, {"_id": 1},
+                                idempotent=True)
+    except errors.InvalidId:
+        return False
+    return user is not None
+
 async def async_delete_user(user_id: str):
     """
     Deletes a user from the database.
@@ -79,12 +114,13 @@ async def async_delete_user(user_id: str):
         )
 
     try:
-        result = await users_collection.delete_one({"_id": ObjectId(user_id)})
+        result = await mongo_call(users_collection.delete_one, {"_id": ObjectId(user_id)}, idempotent=True)
         if not result:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found."
             )
+        await delete_user_stats(user_id)
     except errors.InvalidId as exc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,3 +1,4 @@
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 import uuid
 from typing import Tuple
@@ -6,12 +7,19 @@ import jwt
 from jose import JWTError
 from app.core.config import TOKEN_KEY
 from app.db.redis_client import redis_client
-from app.services.user_services import find_user_by_id
+from app.db.resilience import redis_call
+from app.services.user_services import user_exists
+from app.utils.logging_utils import get_logger
 
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 REFRESH_TOKEN_EXPIRE_DAYS = 30
 
+# Tokens already validated in the current auth context, e.g. one batch request.
+validated_tokens: ContextVar[dict] = ContextVar("validated_tokens", default=None)
+
+logger = get_logger(__name__)
+
 def generate_verification_token(payload: dict) -> str:
     """
     Generate verification token.
@@ -28,7 +36,8 @@ async def generate_access_token(payload: dict) -> str:
     payload["exp"] = int((datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)).timestamp())
     session_id = payload.get("session_id")
     token = jwt.encode(payload, TOKEN_KEY, algorithm="HS256")
-    await redis_client.setex(f"{session_id}_access_token", ACCESS_TOKEN_EXPIRE_MINUTES * 60, token)
+    await redis_call(redis_client.setex, f"{session_id}_access_token", ACCESS_TOKEN_EXPIRE_MINUTES * 60, token,
+                     idempotent=True)
     return token
 
 async def generate_refresh_token(payload: dict) -> str:
@@ -39,7 +48,8 @@ async def generate_refresh_token(payload: dict) -> str:
     payload["exp"] = int((datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)).timestamp())
     session_id = payload.get("session_id")
     token = jwt.encode(payload, TOKEN_KEY, algorithm="HS256")
-    await redis_client.setex(f"{session_id}_refresh_token", REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60, token)
+    await redis_call(redis_client.setex, f"{session_id}_refresh_token", REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60, token,
+                     idempotent=True)
     return token
 
 async def get_refresh_token_from_session(session_id: str) -> str:
@@ -47,7 +57,7 @@ async def get_refresh_token_from_session(session_id: str) -> str:
     Get refresh token from session.
     """
     try:
-        token = await redis_client.get(f"{session_id}_refresh_token")
+        token = await redis_call(redis_client.get, f"{session_id}_refresh_token", idempotent=True)
         if not token:
             return None
         return token.decode("utf-8")
@@ -59,7 +69,7 @@ async def get_access_token_from_session(session_id: str) -> str:
     """
     Get access token from session.
     """
-    token = await redis_client.get(f"{session_id}_access_token")
+    token = await redis_call(redis_client.get, f"{session_id}_access_token", idempotent=True)
     if not token:
         return None
     return token.decode("utf-8")
@@ -81,6 +91,11 @@ async def validate_token(token: str, token_type: str) -> dict:
     """
     Validate token.
     """
+    validated = validated_tokens.get()
+    if validated is not None and (token, token_type) in validated:
+        return dict(validated[(token, token_type)])
+
+    # Fail closed: if the revocation list cannot be checked the token is refused.
     try:
         is_blacklisted = await token_is_blacklisted(token)
     except Exception as exc:
@@ -94,14 +109,16 @@ async def validate_token(token: str, token_type: str) -> dict:
     payload = decode_token(token)
     error = payload.get("error")
     if error:
-        print("Error decoding token:", error)
+        logger.info("Token rejected", extra={"msg_type": "auth.token_rejected",
+                                             "payload": {"reason": "decode", "error": str(error)}})
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Unauthorized access.")
 
     session_id = payload.get("session_id")
     is_right_type = payload.get("token_type") == token_type
     if not is_right_type:
-        print("Token type not equal to token_type.")
+        logger.info("Token rejected", extra={"msg_type": "auth.token_rejected",
+                                             "payload": {"reason": "token_type", "expected": token_type}})
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Unauthorized access.")
 
@@ -111,15 +128,17 @@ async def validate_token(token: str, token_type: str) -> dict:
     }
     stored_token = await token_functions[token_type](session_id)
     if stored_token != token:
-        print("Stored token not equal to token.")
+        logger.info("Token rejected", extra={"msg_type": "auth.token_rejected",
+                                             "payload": {"reason": "not_in_session"}})
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Unauthorized access.")
 
     user_id = payload.get("sub")
-    user = await find_user_by_id(user_id)
-    if not user:
+    if not await user_exists(user_id):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                              detail="Unauthorized access.")
+    if validated is not None:
+        validated[(token, token_type)] = dict(payload)
     return payload
 
 async def store_auth_data(auth_data: dict) -> str:
@@ -127,8 +146,8 @@ async def store_auth_data(auth_data: dict) -> str:
     Store authentication data in redis.
     """
     state_id = str(uuid.uuid4())
-    await redis_client.hset(state_id, mapping=auth_data)
-    await redis_client.expire(state_id, 600)
+    await redis_call(redis_client.hset, state_id, mapping=auth_data, idempotent=True)
+    await redis_call(redis_client.expire, state_id, 600, idempotent=True)
 
     return state_id
 
@@ -136,20 +155,25 @@ async def get_auth_data(state_id: str) -> dict:
     """
     Get authentication data from redis.
     """
-    auth_data = await redis_client.hgetall(state_id)
+    auth_data = await redis_call(redis_client.hgetall, state_id, idempotent=True)
     modified_auth_data = {}
     for key, value in auth_data.items():
         key = key.decode("utf-8")
         modified_auth_data[key] = value.decode("utf-8")
-    await redis_client.delete(state_id)
+    await redis_call(redis_client.delete, state_id, idempotent=True)
     return modified_auth_data
 
 async def blacklist_token(token: str, ttl: int) -> None:
     """
     Blacklist token.
     """
+    # Later requests in the same batch must see the revocation too.
+    validated = validated_tokens.get()
+    if validated is not None:
+        for key in [key for key in validated if key[0] == token]:
+            validated.pop(key, None)
     try:
-        await redis_client.setex(token, ttl, "blacklisted")
+        await redis_call(redis_client.setex, token, ttl, "blacklisted", idempotent=True)
     except Exception as exc:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Token blacklisting failed.") from exc
@@ -158,7 +182,7 @@ async def token_is_blacklisted(token: str) -> bool:
     """
     Check if token is blacklisted.
     """
-    blacklisted = await redis_client.get(token)
+    blacklisted = await redis_call(redis_client.get, token, idempotent=True)
     is_blacklisted = blacklisted == b"blacklisted"
     return is_blacklisted
 
@@ -167,8 +191,8 @@ async def store_registration_data(user_data: dict) -> str:
     Store user's registration data in redis.
     """
     registration_id = f"e-{str(uuid.uuid4())}"
-    await redis_client.hset(registration_id, mapping=user_data)
-    await redis_client.expire(registration_id, 3600)
+    await redis_call(redis_client.hset, registration_id, mapping=user_data, idempotent=True)
+    await redis_call(redis_client.expire, registration_id, 3600, idempotent=True)
 
     return registration_id
 
@@ -176,12 +200,12 @@ async def get_registration_data(registration_id: str) -> dict:
     """
     Get user's registration data from redis.
     """
-    user_data = await redis_client.hgetall(registration_id)
+    user_data = await redis_call(redis_client.hgetall, registration_id, idempotent=True)
     modified_user_data = {}
     for key, value in user_data.items():
         key = key.decode("utf-8")
         modified_user_data[key] = value.decode("utf-8")
-    await redis_client.delete(registration_id)
+    await redis_call(redis_client.delete, registration_id, idempotent=True)
     return modified_user_data
 
 async def blacklist_tokens(access_token_str: str) -> str:
@@ -208,8 +232,8 @@ async def blacklist_tokens(access_token_str: str) -> str:
         )
 
     try:
-        await redis_client.delete(f"{session_id}_access_token")
-        await redis_client.delete(f"{session_id}_refresh_token")
+        await redis_call(redis_client.delete, f"{session_id}_access_token", idempotent=True)
+        await redis_call(redis_client.delete, f"{session_id}_refresh_token", idempotent=True)
     except Exception as exc:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Error deleting tokens.") from exc
@@ -222,11 +246,11 @@ async def get_session_expires_at(session_id: str, user_id:str) -> str:
     """
     access_token = await get_refresh_token_from_session(session_id)
     if not access_token:
-        print("Access token not found.")
+        logger.info("Session token not found", extra={"msg_type": "auth.session_missing"})
         return None
     payload = decode_token(access_token)
     if not payload.get("error") and payload.get("sub") == user_id:
         timestamp =  payload.get("exp")
         return datetime.fromtimestamp(timestamp).isoformat()
-    print("Error getting session expires at or user ID not equal to sub.")
+    logger.info("Session token invalid or for another user", extra={"msg_type": "auth.session_invalid"})
     return None
@@ -0,0 +1,131 @@
+"""
+Redis side of event bookings.
+
+Each bookable event has a hash with its capacity and booking details and a
+hash of holders (user or phone number) to booking IDs. The reserve script
+checks and claims a seat in one atomic step, so concurrent requests from
+the app and USSD can never oversell.
+"""
+from app.db.redis_client import redis_client
+from app.db.resilience import redis_call
+
+
+BOOKINGS_PENDING = "booking:pending"
+BOOKINGS_FLUSH_LOCK = "booking:flush:lock"
+UNLIMITED_CAPACITY = -1
+
+RESERVED = 0
+ALREADY_BOOKED = 1
+SOLD_OUT = -1
+NOT_LOADED = -2
+WRONG_GROUP = -3
+
+RESERVE_SCRIPT = """
+local event = redis.call('HMGET', KEYS[1], 'capacity', 'group_id')
+if not event[1] then
+    return {-2, ''}
+end
+if event[2] ~= ARGV[4] then
+    return {-3, ''}
+end
+local existing = redis.call('HGET', KEYS[2], ARGV[1])
+if existing then
+    return {1, existing}
+end
+local capacity = tonumber(event[1])
+if capacity >= 0 and redis.call('HLEN', KEYS[2]) >= capacity then
+    return {-1, ''}
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('RPUSH', KEYS[3], ARGV[3])
+return {0, ARGV[2]}
+"""
+
+reserve_script = redis_client.register_script(RESERVE_SCRIPT)
+
+def booking_event_key(event_id: str) -> str:
+    """
+    Redis key of an event's capacity and booking details.
+    """
+    return f"booking:event:{event_id}"
+
+def booking_holders_key(event_id: str) -> str:
+    """
+    Redis key of an event's holder -> booking ID hash.
+    """
+    return f"booking:holders:{event_id}"
+
+def booking_capacity(event: dict) -> int:
+    """
+    Seats on sale for an event. Cancelled events sell nothing and events
+    without a capacity are unlimited.
+    """
+    if event.get("status") != "active":
+        return 0
+    capacity = event.get("capacity")
+    return UNLIMITED_CAPACITY if capacity is None else capacity
+
+def booking_details(group_id: str, event: dict) -> dict:
+    """
+    What the reserve path needs to know about an event.
+    """
+    return {
+        "group_id": group_id,
+        "capacity": booking_capacity(event),
+        "fee": event.get("fee", 0),
+        "support_contact": event.get("support_contact", ""),
+        "after_booking_message": event.get("after_booking_message", ""),
+    }
+
+async def reserve_seat(group_id: str, event_id: str, holder: str, booking_id: str, booking_json: str) -> tuple:
+    """
+    Atomically reserve a seat for `holder`. Returns (outcome, booking ID);
+    a holder who already booked gets their existing booking back.
+    """
+    outcome, reserved_id = await redis_call(
+        reserve_script,
+        keys=[booking_event_key(event_id), booking_holders_key(event_id), BOOKINGS_PENDING],
+        args=[holder, booking_id, booking_json, group_id],
+        idempotent=True
+    )
+    if isinstance(reserved_id, bytes):
+        reserved_id = reserved_id.decode("utf-8")
+    return outcome, reserved_id
+
+async def get_booking_details(event_id: str) -> dict:
+    """
+    Booking details of a loaded event.
+    """
+    details = await redis_call(redis_client.hgetall, booking_event_key(event_id), idempotent=True)
+    return {key.decode("utf-8"): value.decode("utf-8") for key, value in details.items()}
+
+async def load_booking_event(event_id: str, group_id: str, event: dict, holders: dict):
+    """
+    Load an event and its persisted bookings into Redis. Holders are added
+    before the capacity, so no seat is sold until the count is complete.
+    """
+    async def apply():
+        pipe = redis_client.pipeline(transaction=True)
+        for holder, booking_id in holders.items():
+            pipe.hsetnx(booking_holders_key(event_id), holder, booking_id)
+        pipe.hset(booking_event_key(event_id), mapping=booking_details(group_id, event))
+        return await pipe.execute()
+
+    await redis_call(apply, idempotent=True)
+
+async def set_booking_event(event_id: str, group_id: str, event: dict, only_if_loaded: bool = True):
+    """
+    Refresh a loaded event's capacity and details after it changes.
+    Unloaded events are left to be loaded with their bookings on demand.
+    """
+    key = booking_event_key(event_id)
+    if only_if_loaded and not await redis_call(redis_client.exists, key, idempotent=True):
+        return
+    await redis_call(redis_client.hset, key, mapping=booking_details(group_id, event), idempotent=True)
+
+async def drop_booking_event(event_id: str):
+    """
+    Stop selling seats for a deleted event.
+    """
+    await redis_call(redis_client.delete, booking_event_key(event_id), booking_holders_key(event_id),
+                     idempotent=True)
@@ -1,5 +1,17 @@
-from fastapi import HTTPException
+import base64
+import json
+from datetime import datetime, timezone
+from fastapi import HTTPException, status
 from app.db.mongo_client import users_collection
+from app.db.redis_client import redis_client
+from app.db.resilience import mongo_call, redis_call
+from app.utils.search_utils import search_doc_key, search_doc
+from app.utils.sync_utils import record_event_change
+
+
+EVENT_STATUSES = ("active", "cancelled")
+EVENTS_TIME_INDEX = "events:time"
+EVENTS_TIME_INDEX_BUILT = "events:time:built"
 
 async def get_groups(page:int = 1, limit:int = 5):
     """
@@ -11,11 +23,139 @@ async def get_groups(page:int = 1, limit:int = 5):
     skip = (page - 1) * limit  # Calculate how many documents to skip
 
     # Query MongoDB
-    users_cursor = users_collection.find({}).skip(skip).limit(limit)
-    users_list = await users_cursor.to_list(length=limit)  # Convert cursor to list
+    users_cursor = users_collection.find({}).sort("_id", 1).skip(skip).limit(limit)  # Walk the _id index
+    users_list = await mongo_call(users_cursor.to_list, length=limit)  # Convert cursor to list
 
     # Convert _id (ObjectId) to string
     for user in users_list:
         user["_id"] = str(user["_id"])
 
     return {"page": page, "limit": limit, "users": users_list}
+
+def event_time_index_key(event_status: str, user_id: str = None) -> str:
+    """
+    Name of the sorted set holding events of a status, optionally for one group.
+    """
+    key = f"{EVENTS_TIME_INDEX}:{event_status}"
+    if user_id:
+        return f"{key}:{user_id}"
+    return key
+
+def event_timestamp(date) -> float:
+    """
+    Sorted set score for an event date. Naive datetimes are taken as UTC,
+    which is how Mongo hands them back.
+    """
+    if isinstance(date, str):  # Events stored before dates were native.
+        date = datetime.fromisoformat(date)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+def encode_cursor(score: float, member: str) -> str:
+    """
+    Encode the last returned index entry as an opaque cursor.
+    """
+    raw = json.dumps([score, member]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("utf-8")
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor produced by `encode_cursor`.
+    """
+    try:
+        score, member = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+        return float(score), str(member)
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Invalid cursor.") from exc
+
+async def index_event(user_id: str, event_id: str, event: dict):
+    """
+    Place an event in the time index under its current status and refresh
+    its search document.
+    """
+    member = f"{user_id}:{event_id}"
+    score = event_timestamp(event["date"])
+    event_status = event.get("status")
+
+    async def apply():
+        pipe = redis_client.pipeline(transaction=True)
+        for each_status in EVENT_STATUSES:
+            pipe.zrem(event_time_index_key(each_status), member)
+            pipe.zrem(event_time_index_key(each_status, user_id), member)
+        if event_status in EVENT_STATUSES:
+            pipe.zadd(event_time_index_key(event_status), {member: score})
+            pipe.zadd(event_time_index_key(event_status, user_id), {member: score})
+        pipe.hset(search_doc_key(user_id, event_id), mapping=search_doc(user_id, event_id, event, score))
+        return await pipe.execute()
+
+    await redis_call(apply, idempotent=True)
+
+async def unindex_event(user_id: str, event_id: str):
+    """
+    Remove an event from the time index and the search index.
+    """
+    member = f"{user_id}:{event_id}"
+
+    async def apply():
+        pipe = redis_client.pipeline(transaction=True)
+        for each_status in EVENT_STATUSES:
+            pipe.zrem(event_time_index_key(each_status), member)
+            pipe.zrem(event_time_index_key(each_status, user_id), member)
+        pipe.delete(search_doc_key(user_id, event_id))
+        return await pipe.execute()
+
+    await redis_call(apply, idempotent=True)
+
+async def query_event_index(event_status: str, start: float, end: float, limit: int,
+                            cursor: str = None, user_id: str = None) -> tuple:
+    """
+    Read up to `limit` (user_id, event_id) pairs from the time index in date
+    order, starting after `cursor`. Returns the pairs and the next cursor.
+    """
+    key = event_time_index_key(event_status, user_id)
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        start = max(start, after[0])
+
+    entries = []
+    offset = 0
+    batch = limit + 1
+    while len(entries) <= limit:
+        page = await redis_call(redis_client.zrangebyscore, key, start, end,
+                                start=offset, num=batch, withscores=True, idempotent=True)
+        for member, score in page:
+            member = member.decode("utf-8")
+            # Equal scores are ordered by member, so (score, member) is a total order.
+            if after and (score, member) <= after:
+                continue
+            entries.append((score, member))
+        if len(page) < batch:
+            break
+        offset += batch
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(*entries[-1])
+
+    return [tuple(member.split(":", 1)) for _, member in entries], next_cursor
+
+async def build_event_index():
+    """
+    Index every stored event once, so events created before the indexes
+    existed are queryable, searchable and in the sync change log.
+    """
+    already_built = await redis_call(redis_client.exists, EVENTS_TIME_INDEX_BUILT, idempotent=True)
+    if already_built:
+        return
+
+    users = users_collection.find({"events": {"$exists": True}}, {"events": 1})
+    async for user in users:
+        for event_id, event in user.get("events", {}).items():
+            await index_event(str(user["_id"]), event_id, event)
+            await record_event_change(str(user["_id"]), event_id)
+    await redis_call(redis_client.set, EVENTS_TIME_INDEX_BUILT, 1, idempotent=True)
+    print("Events time index built.")
@@ -0,0 +1,49 @@
+"""
+Redis locks for work only one worker may do at a time.
+
+A lock is a key holding its owner's random token, with a TTL so a crashed
+owner cannot hold it forever. Refreshing and releasing compare the token
+in a script, so an owner whose lock already expired cannot extend or
+delete the lock another worker has taken since.
+"""
+import uuid
+from app.db.redis_client import redis_client
+from app.db.resilience import redis_call
+
+
+REFRESH_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+refresh_lock_script = redis_client.register_script(REFRESH_LOCK_SCRIPT)
+release_lock_script = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+async def acquire_lock(key: str, ttl: int) -> str:
+    """
+    Take the lock if it is free. Returns the owner's token, or None.
+    """
+    token = str(uuid.uuid4())
+    locked = await redis_call(redis_client.set, key, token, nx=True, ex=ttl)
+    return token if locked else None
+
+async def refresh_lock(key: str, token: str, ttl: int) -> bool:
+    """
+    Extend a held lock's TTL. False if it is no longer ours.
+    """
+    return bool(await redis_call(refresh_lock_script, keys=[key], args=[token, ttl], idempotent=True))
+
+async def release_lock(key: str, token: str) -> bool:
+    """
+    Release a lock if we still hold it.
+    """
+    return bool(await redis_call(release_lock_script, keys=[key], args=[token], idempotent=True))
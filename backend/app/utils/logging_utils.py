@@ -0,0 +1,180 @@
+"""
+Structured logging.
+
+Request code only puts records on a bounded queue; a background thread
+formats them as JSON lines and writes them to stdout. High-volume message
+types are sampled and payloads are truncated, so logging cannot stall the
+event loop or flood the output with whole documents.
+"""
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+
+LOG_QUEUE_SIZE = 10000
+MAX_PAYLOAD_CHARS = 512
+
+# Share of records kept per message type; types not listed are always kept.
+SAMPLE_RATES = {
+    "event.added": 0.1,
+    "event.stored": 0.1,
+    "auth.token_rejected": 0.2,
+}
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default=None)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamp records with the current request ID.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a share of records of each high-volume message type.
+    Warnings and errors are always kept.
+    """
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "msg_type", None), 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records instead of blocking when the queue is full.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Only resolve the message here; formatting happens on the writer thread.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the payload truncated.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in ("request_id", "msg_type"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            entry["payload"] = truncate(json.dumps(payload, default=str))
+        if record.exc_info:
+            entry["exc"] = truncate(self.formatException(record.exc_info), 4 * MAX_PAYLOAD_CHARS)
+        return json.dumps(entry)
+
+
+def truncate(text: str, limit: int = MAX_PAYLOAD_CHARS) -> str:
+    """
+    Cut text down to `limit` characters.
+    """
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+queue_handler = DroppingQueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(SAMPLE_RATES))
+queue_handler.addFilter(RequestContextFilter())
+listener = None
+
+def setup_logging(level: int = logging.INFO):
+    """
+    Route the app's loggers through the queue and start the writer thread.
+    """
+    global listener
+    if listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(level)
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+
+def shutdown_logging():
+    """
+    Flush queued records and stop the writer thread.
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+class RequestIdMiddleware:
+    """
+    Give every request an ID (the client's X-Request-ID if it sent one),
+    make it available to log records and echo it in the response.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger for an app module.
+    """
+    return logging.getLogger(name)
@@ -0,0 +1,89 @@
+"""
+Profile picture processing.
+
+Decoding and resizing are CPU-bound, so they run in a process pool rather
+than on the event loop. This module only imports the standard library and
+Pillow, which keeps the pool's worker processes light to start.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+
+
+THUMBNAIL_SIZES = (64, 128, 256)
+THUMBNAIL_WORKERS = 2
+MAX_PICTURE_PIXELS = 40_000_000
+
+# Leading bytes of every supported format, and the extension it is stored under.
+PICTURE_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"\xff\xd8\xff": "jpg",
+}
+PIL_FORMATS = {"png": "PNG", "jpg": "JPEG"}
+
+picture_pool = None
+
+def sniff_picture_type(header: bytes) -> str:
+    """
+    Extension of the picture format the header starts with, or None.
+    """
+    for signature, picture_type in PICTURE_SIGNATURES.items():
+        if header.startswith(signature):
+            return picture_type
+    return None
+
+def make_thumbnails(source: str, picture_type: str, destinations: dict) -> list:
+    """
+    Decode a picture and write a square thumbnail for each size in
+    `destinations` (size -> path). Raises ValueError if the file is not a
+    picture of the expected type.
+    """
+    with Image.open(source) as image:
+        if image.format != PIL_FORMATS[picture_type]:
+            raise ValueError("Picture does not match its declared type.")
+        if image.width * image.height > MAX_PICTURE_PIXELS:
+            raise ValueError("Picture is too large.")
+        image.load()
+        image = ImageOps.exif_transpose(image)
+        if picture_type == "jpg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        written = []
+        for size, destination in destinations.items():
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            # Write next to the target and rename, so readers never see half a file.
+            partial = f"{destination}.{os.getpid()}.part"
+            thumbnail.save(partial, PIL_FORMATS[picture_type], optimize=True)
+            os.replace(partial, destination)
+            written.append(size)
+    return written
+
+def get_picture_pool() -> ProcessPoolExecutor:
+    """
+    The process pool pictures are resized in, started on first use.
+    """
+    global picture_pool
+    if picture_pool is None:
+        # Spawned workers do not inherit the server's sockets and threads.
+        picture_pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS,
+                                           mp_context=multiprocessing.get_context("spawn"))
+    return picture_pool
+
+async def generate_thumbnails(source: str, picture_type: str, destinations: dict) -> list:
+    """
+    Run make_thumbnails in the process pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_picture_pool(), make_thumbnails, source, picture_type, destinations)
+
+def shutdown_picture_pool():
+    """
+    Stop the pool's worker processes.
+    """
+    global picture_pool
+    if picture_pool is not None:
+        picture_pool.shutdown(wait=True, cancel_futures=True)
+        picture_pool = None
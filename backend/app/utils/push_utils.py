@@ -0,0 +1,113 @@
+"""
+Fan-out of event changes to push subscribers.
+
+Writers publish each change on a Redis channel. Every worker holds a
+single subscription to it and copies messages into bounded per-connection
+queues, so one Redis connection serves all of a worker's subscribers.
+"""
+import asyncio
+import json
+from fastapi.encoders import jsonable_encoder
+from app.db.redis_client import redis_client
+from app.db.resilience import redis_call
+from app.utils.logging_utils import get_logger
+
+
+EVENTS_CHANNEL = "events:changes"
+SUBSCRIBER_QUEUE_SIZE = 100
+RESUBSCRIBE_DELAY = 1
+
+logger = get_logger(__name__)
+
+async def publish_event_change(sequence: int, group_id: str, event_id: str, operation: str, event: dict = None):
+    """
+    Publish an event change to every worker.
+    """
+    message = json.dumps(jsonable_encoder({
+        "seq": sequence,
+        "op": operation,
+        "group_id": group_id,
+        "event_id": event_id,
+        "event": event,
+    }))
+    await redis_call(redis_client.publish, EVENTS_CHANNEL, message)
+
+
+class Subscriber:
+    """
+    One push connection's queue of pending messages. A subscriber that
+    falls too far behind is marked overflowed instead of growing its queue.
+    """
+    def __init__(self, group_id: str = None):
+        self.group_id = group_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, message: dict):
+        """
+        Queue a message for this connection if it is in its feed.
+        """
+        if self.overflowed:
+            return
+        if self.group_id and message.get("group_id") != self.group_id:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Broadcaster:
+    """
+    The worker's single subscription to the events channel.
+    """
+    def __init__(self):
+        self.subscribers = set()
+        self.listener = None
+
+    def subscribe(self, group_id: str = None) -> Subscriber:
+        """
+        Register a connection, starting the listener on first use.
+        """
+        subscriber = Subscriber(group_id)
+        self.subscribers.add(subscriber)
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """
+        Forget a closed connection.
+        """
+        self.subscribers.discard(subscriber)
+
+    def deliver(self, message: dict):
+        """
+        Offer a published change to every connection on this worker.
+        """
+        for subscriber in list(self.subscribers):
+            subscriber.offer(message)
+
+    async def listen(self):
+        """
+        Copy channel messages to subscribers, resubscribing after errors.
+        """
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    self.deliver(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error listening for event changes")
+                await asyncio.sleep(RESUBSCRIBE_DELAY)
+            finally:
+                await pubsub.close()
+
+
+broadcaster = Broadcaster()
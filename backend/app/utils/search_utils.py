@@ -0,0 +1,131 @@
+"""
+Full-text search over events, backed by a RediSearch index on event hashes.
+"""
+import hashlib
+import json
+import re
+from aioredis.exceptions import ResponseError
+from app.db.redis_client import redis_client
+from app.db.resilience import redis_call
+
+
+SEARCH_INDEX_NAME = "idx:events"
+SEARCH_DOC_PREFIX = "event:"
+# How long a search's matches are reused. Writes do not invalidate the
+# cache, so this bounds how late a new or retitled event shows up in search.
+SEARCH_CACHE_TTL = 15
+MIN_FUZZY_TERM_LENGTH = 4
+
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+SEARCH_SCHEMA = (
+    "title", "TEXT", "WEIGHT", 5.0,
+    "description", "TEXT", "WEIGHT", 1.0,
+    "location", "TEXT", "WEIGHT", 2.0,
+    "status", "TAG",
+    "group_id", "TAG",
+    "date", "NUMERIC", "SORTABLE",
+)
+
+def search_doc_key(user_id: str, event_id: str) -> str:
+    """
+    Redis key of the hash indexed for an event.
+    """
+    return f"{SEARCH_DOC_PREFIX}{user_id}:{event_id}"
+
+def search_doc(user_id: str, event_id: str, event: dict, timestamp: float) -> dict:
+    """
+    Fields of an event that go into the search index.
+    """
+    return {
+        "event_id": event_id,
+        "group_id": user_id,
+        "title": event.get("title", ""),
+        "description": event.get("description", ""),
+        "location": event.get("location", ""),
+        "status": event.get("status", ""),
+        "date": timestamp,
+    }
+
+async def create_search_index():
+    """
+    Create the events search index if it does not exist.
+    Existing event hashes are indexed by Redis in the background.
+    """
+    try:
+        await redis_call(
+            redis_client.execute_command,
+            "FT.CREATE", SEARCH_INDEX_NAME, "ON", "HASH",
+            "PREFIX", 1, SEARCH_DOC_PREFIX,
+            "SCHEMA", *SEARCH_SCHEMA,
+            idempotent=True
+        )
+        print("Events search index created.")
+    except ResponseError as exc:
+        if "already exists" not in str(exc).lower():
+            raise RuntimeError(f"Failed to create events search index: {exc}") from exc
+
+def build_search_query(text: str, event_status: str = None, start: float = None, end: float = None) -> str:
+    """
+    Build a RediSearch query. Every term matches as a prefix, and longer
+    terms also match with one typo.
+    """
+    clauses = []
+    for term in TERM_PATTERN.findall(text.lower()):
+        if len(term) >= MIN_FUZZY_TERM_LENGTH:
+            clauses.append(f"({term}*|%{term}%)")
+        elif len(term) >= 2:
+            clauses.append(f"{term}*")
+        else:
+            clauses.append(term)
+
+    if event_status:
+        clauses.append(f"@status:{{{event_status}}}")
+    if start is not None or end is not None:
+        low = start if start is not None else "-inf"
+        high = end if end is not None else "+inf"
+        clauses.append(f"@date:[{low} {high}]")
+
+    return " ".join(clauses) if clauses else "*"
+
+async def search_event_index(query: str, offset: int, limit: int) -> tuple:
+    """
+    Run a query against the index. Returns the total hit count and the
+    (user_id, event_id) pairs of this page, best match first.
+    """
+    response = await redis_call(
+        redis_client.execute_command,
+        "FT.SEARCH", SEARCH_INDEX_NAME, query,
+        "RETURN", 2, "group_id", "event_id",
+        "LIMIT", offset, limit,
+        idempotent=True
+    )
+    total = response[0]
+    entries = []
+    # The reply is [total, key, [field, value, ...], key, [...], ...].
+    for fields in response[2::2]:
+        values = dict(zip(fields[::2], fields[1::2]))
+        entries.append((values[b"group_id"].decode("utf-8"), values[b"event_id"].decode("utf-8")))
+    return total, entries
+
+def search_cache_key(params: dict) -> str:
+    """
+    Cache key for a search.
+    """
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"events:search:{digest}"
+
+async def get_cached_search(key: str) -> tuple:
+    """
+    Cached total and (user_id, event_id) matches of a search, or None.
+    """
+    cached = await redis_call(redis_client.get, key, idempotent=True)
+    if not cached:
+        return None
+    total, entries = json.loads(cached)
+    return total, [tuple(entry) for entry in entries]
+
+async def cache_search(key: str, total: int, entries: list):
+    """
+    Cache a search's matches for SEARCH_CACHE_TTL.
+    """
+    await redis_call(redis_client.setex, key, SEARCH_CACHE_TTL, json.dumps([total, entries]), idempotent=True)
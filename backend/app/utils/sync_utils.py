@@ -0,0 +1,136 @@
+"""
+Change log for delta sync.
+
+Every event write bumps a global sequence number and records it against
+the event in a sorted set, so the log holds one entry per event (its
+latest change) rather than one per write. Deleted events stay as
+tombstones until compaction drops them; clients that synced before the
+oldest dropped tombstone must do a full resync.
+"""
+import time
+from app.db.redis_client import redis_client
+from app.db.resilience import redis_call
+
+
+CHANGES_SEQUENCE = "changes:seq"
+CHANGES_INDEX = "changes:events"
+CHANGES_TOMBSTONES = "changes:tombstones"
+CHANGES_FLOOR = "changes:floor"
+CHANGES_USERS = "changes:users"
+TOMBSTONE_RETENTION = 30 * 24 * 60 * 60
+COMPACTION_BATCH = 1000
+
+RECORD_CHANGE_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], seq, ARGV[1])
+if ARGV[2] == '1' then
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+else
+    redis.call('ZREM', KEYS[3], ARGV[1])
+end
+return seq
+"""
+
+RECORD_USER_CHANGE_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('HSET', KEYS[2], ARGV[1], seq)
+return seq
+"""
+
+COMPACT_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local floor = tonumber(redis.call('GET', KEYS[3]) or '0')
+for _, member in ipairs(expired) do
+    local seq = tonumber(redis.call('ZSCORE', KEYS[1], member) or '0')
+    if seq > floor then
+        floor = seq
+    end
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZREM', KEYS[2], member)
+end
+redis.call('SET', KEYS[3], floor)
+return #expired
+"""
+
+record_change_script = redis_client.register_script(RECORD_CHANGE_SCRIPT)
+record_user_change_script = redis_client.register_script(RECORD_USER_CHANGE_SCRIPT)
+compact_script = redis_client.register_script(COMPACT_SCRIPT)
+
+def change_member(user_id: str, event_id: str) -> str:
+    """
+    Change log member of an event.
+    """
+    return f"{user_id}:{event_id}"
+
+async def record_event_change(user_id: str, event_id: str, deleted: bool = False) -> int:
+    """
+    Record that an event was created, updated or deleted.
+    """
+    return await redis_call(
+        record_change_script,
+        keys=[CHANGES_SEQUENCE, CHANGES_INDEX, CHANGES_TOMBSTONES],
+        args=[change_member(user_id, event_id), "1" if deleted else "0", time.time()]
+    )
+
+async def record_user_change(user_id: str) -> int:
+    """
+    Record that a user's profile changed.
+    """
+    return await redis_call(
+        record_user_change_script,
+        keys=[CHANGES_SEQUENCE, CHANGES_USERS],
+        args=[user_id]
+    )
+
+async def read_changes(since: int, limit: int) -> tuple:
+    """
+    Up to `limit` event changes after `since`, oldest first, as
+    (sequence, user_id, event_id, deleted) tuples, plus whether more remain.
+    """
+    entries = await redis_call(redis_client.zrangebyscore, CHANGES_INDEX, f"({since}", "+inf",
+                               start=0, num=limit + 1, withscores=True, idempotent=True)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return [], has_more
+
+    members = [member for member, _ in entries]
+    tombstones = await redis_call(redis_client.execute_command, "ZMSCORE", CHANGES_TOMBSTONES, *members,
+                                  idempotent=True)
+
+    changes = []
+    for (member, sequence), tombstone in zip(entries, tombstones):
+        user_id, event_id = member.decode("utf-8").split(":", 1)
+        changes.append((int(sequence), user_id, event_id, tombstone is not None))
+    return changes, has_more
+
+async def get_sync_position() -> tuple:
+    """
+    Current sequence number and the oldest token that can still sync.
+    """
+    sequence, floor = await redis_call(redis_client.mget, CHANGES_SEQUENCE, CHANGES_FLOOR, idempotent=True)
+    return int(sequence or 0), int(floor or 0)
+
+async def get_user_change(user_id: str) -> int:
+    """
+    Sequence number of a user's last profile change.
+    """
+    sequence = await redis_call(redis_client.hget, CHANGES_USERS, user_id, idempotent=True)
+    return int(sequence or 0)
+
+async def compact_change_log() -> int:
+    """
+    Drop tombstones older than the retention window and raise the floor.
+    """
+    cutoff = time.time() - TOMBSTONE_RETENTION
+    removed = 0
+    while True:
+        batch = await redis_call(
+            compact_script,
+            keys=[CHANGES_INDEX, CHANGES_TOMBSTONES, CHANGES_FLOOR],
+            args=[cutoff, COMPACTION_BATCH],
+            idempotent=True
+        )
+        removed += batch
+        if batch < COMPACTION_BATCH:
+            return removed
@@ -5,11 +5,13 @@ from fastapi import UploadFile
 from redisbloom.client import Client as RedisBloomClient
 from app.db.mongo_client import users_collection
 from app.db.redis_client import redis_client
+from app.db.resilience import redis_call, redis_sync_call, DatastoreUnavailable
 from app.core.config import REDIS_HOST
 
 
-redis_bloom = RedisBloomClient(host=REDIS_HOST)
+redis_bloom = RedisBloomClient(host=REDIS_HOST, socket_timeout=2, socket_connect_timeout=2)
 BLOOM_FILTER_NAME = "usernames_bloom_filter"
+BLOOM_LOAD_BATCH_SIZE = 1000
 
 PICTURES_DIR = Path("~/SYLA-profile-pictures/").expanduser()
 ALLOWED_PIC_EXTENSIONS = ["png", "jpg", "jpeg"]
@@ -18,12 +20,14 @@ async def create_bloom_filter():
     """
     Create a bloom filter to store usernames.
     """
-    it_exists = await redis_client.exists(BLOOM_FILTER_NAME)
+    it_exists = await redis_call(redis_client.exists, BLOOM_FILTER_NAME, idempotent=True)
     if not it_exists:  # Check if the Bloom filter already exists
         try:
-            redis_bloom.bfCreate(BLOOM_FILTER_NAME, 0.01, 500000)
+            await redis_sync_call(redis_bloom.bfCreate, BLOOM_FILTER_NAME, 0.01, 500000)
             await load_usernames_into_bloom_filter()
             print("Bloom filter created successfully.")
+        except DatastoreUnavailable:
+            raise
         except Exception as e:
             raise RuntimeError(f"Failed to create bloom filter: {e}") from e
     else:
@@ -33,29 +37,42 @@ async def load_usernames_into_bloom_filter():
     """
     Load usernames from the database into the bloom filter.
     """
-    users = await users_collection.find({}, {"username": 1})
+    users = users_collection.find({"username": {"$type": "string"}}, {"username": 1},
+                                  batch_size=BLOOM_LOAD_BATCH_SIZE)
     try:
+        batch = []
         async for user in users:
-            redis_bloom.bfAdd(BLOOM_FILTER_NAME, user["username"])
+            batch.append(user["username"])
+            if len(batch) == BLOOM_LOAD_BATCH_SIZE:
+                await redis_sync_call(redis_bloom.bfMAdd, BLOOM_FILTER_NAME, *batch, idempotent=True)
+                batch = []
+        if batch:
+            await redis_sync_call(redis_bloom.bfMAdd, BLOOM_FILTER_NAME, *batch, idempotent=True)
+    except DatastoreUnavailable:
+        raise
     except Exception as e:
         raise RuntimeError(f"Failed to load usernames into bloom filter: {e}") from e
 
-def username_is_available(username: str) -> bool:
+async def username_is_available(username: str) -> bool:
     """
     Check if a username is available to be used.
     """
     try:
-        result = redis_bloom.bfExists(BLOOM_FILTER_NAME, username)
+        result = await redis_sync_call(redis_bloom.bfExists, BLOOM_FILTER_NAME, username, idempotent=True)
         return not result
+    except DatastoreUnavailable:
+        raise
     except Exception as e:
         raise RuntimeError(f"Failed to check username availability: {e}") from e
 
-def add_username_to_bloom_filter(username: str):
+async def add_username_to_bloom_filter(username: str):
     """
     Add a username to the bloom filter.
     """
     try:
-        redis_bloom.bfAdd(BLOOM_FILTER_NAME, username)
+        await redis_sync_call(redis_bloom.bfAdd, BLOOM_FILTER_NAME, username, idempotent=True)
+    except DatastoreUnavailable:
+        raise
     except Exception as e:
         raise RuntimeError(f"Failed to add username to bloom filter: {e}") from e
 
@@ -67,7 +84,7 @@ async def cache_user(user: dict):
     user["_id"] = user_id
     data = json.dumps(user)
     try:
-        await redis_client.setex(user_id, 3600, data)
+        await redis_call(redis_client.setex, user_id, 3600, data, idempotent=True)
     except Exception as e:
         raise RuntimeError(e) from e
 
@@ -76,11 +93,14 @@ async def get_cached_user(user_id: str) -> dict:
     Retrieve cached user data.
     """
     try:
-        user_data = await redis_client.get(user_id)
+        user_data = await redis_call(redis_client.get, user_id, idempotent=True)
         if not user_data:
             return None
         user_data = json.loads(user_data)
         return user_data
+    except DatastoreUnavailable:
+        # Degrade to a cache miss so callers fall back to Mongo.
+        return None
     except Exception as e:
         raise RuntimeError(e) from e
 
@@ -89,6 +109,6 @@ async def delete_cached_user(user_id: str):
     Delete user data from the cache.
     """
     try:
-        await redis_client.delete(user_id)
+        await redis_call(redis_client.delete, user_id, idempotent=True)
     except Exception as e:
         raise RuntimeError(e) from e
@@ -0,0 +1,143 @@
+"""
+Document versions for ETags.
+
+Users and events carry a `version` counter that every write bumps. The
+current versions are cached in Redis so conditional requests can be
+answered without loading or serializing the documents. The cache only
+ever moves forward, so a slow reader cannot put an old version back.
+
+Writers drop the cached versions before writing to Mongo and cache the
+new ones afterwards. A write whose cache update fails therefore leaves no
+cached version behind rather than a stale one that would answer 304s.
+"""
+from bson import ObjectId, errors
+from app.db.mongo_client import users_collection
+from app.db.redis_client import redis_client
+from app.db.resilience import mongo_call, redis_call, DatastoreUnavailable
+from app.utils.logging_utils import get_logger
+
+
+VERSION_CACHE_TTL = 3600
+
+CACHE_VERSION_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '-1')
+local version = tonumber(ARGV[1])
+if version > current then
+    redis.call('SET', KEYS[1], version, 'EX', ARGV[2])
+    return version
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return current
+"""
+
+cache_version_script = redis_client.register_script(CACHE_VERSION_SCRIPT)
+
+logger = get_logger(__name__)
+
+def user_version_key(user_id: str) -> str:
+    """
+    Redis key of a user's cached version.
+    """
+    return f"version:user:{user_id}"
+
+def event_version_key(event_id: str) -> str:
+    """
+    Redis key of an event's cached version.
+    """
+    return f"version:event:{event_id}"
+
+def user_etag(user_id: str, version: int) -> str:
+    """
+    Strong ETag of a user document.
+    """
+    return f'"u-{user_id}-{version}"'
+
+def event_etag(event_id: str, version: int) -> str:
+    """
+    Strong ETag of an event.
+    """
+    return f'"e-{event_id}-{version}"'
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Check an If-None-Match or If-Match header against an ETag.
+    """
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def etag_version(header: str, event_id: str) -> int:
+    """
+    Version an If-Match header refers to for an event, or None.
+    """
+    prefix = f'"e-{event_id}-'
+    value = header.strip()
+    if not (value.startswith(prefix) and value.endswith('"')):
+        return None
+    version = value[len(prefix):-1]
+    return int(version) if version.isdigit() else None
+
+async def cache_version(key: str, version: int) -> int:
+    """
+    Cache a version unless a newer one is already cached.
+    """
+    cached = await redis_call(cache_version_script, keys=[key], args=[version, VERSION_CACHE_TTL],
+                              idempotent=True)
+    return int(cached)
+
+async def invalidate_versions(*keys: str):
+    """
+    Drop cached versions ahead of a write.
+    """
+    await redis_call(redis_client.delete, *keys, idempotent=True)
+
+async def advance_version(key: str, version: int):
+    """
+    Cache the version a write produced. If Redis fails the key is dropped
+    instead, and the write itself is not failed since it has committed.
+    """
+    try:
+        await cache_version(key, version)
+    except DatastoreUnavailable:
+        try:
+            await invalidate_versions(key)
+        except DatastoreUnavailable:
+            logger.warning("Could not update cached version", extra={"payload": {"key": key}})
+
+async def get_user_version(user_id: str) -> int:
+    """
+    A user's current version, from the cache when possible.
+    """
+    cached = await redis_call(redis_client.get, user_version_key(user_id), idempotent=True)
+    if cached is not None:
+        return int(cached)
+    try:
+        user = await mongo_call(users_collection.find_one, {"_id": ObjectId(user_id)}, {"version": 1},
+                                idempotent=True)
+    except errors.InvalidId:
+        return None
+    if not user:
+        return None
+    return await cache_version(user_version_key(user_id), user.get("version", 0))
+
+async def get_event_version(group_id: str, event_id: str) -> int:
+    """
+    An event's current version, from the cache when possible.
+    """
+    cached = await redis_call(redis_client.get, event_version_key(event_id), idempotent=True)
+    if cached is not None:
+        return int(cached)
+    try:
+        document = await mongo_call(
+            users_collection.find_one,
+            {"_id": ObjectId(group_id), f"events.{event_id}": {"$exists": True}},
+            {f"events.{event_id}.version": 1, "_id": 0},
+            idempotent=True
+        )
+    except errors.InvalidId:
+        return None
+    if not document:
+        return None
+    version = document["events"][event_id].get("version", 0)
+    return await cache_version(event_version_key(event_id), version)
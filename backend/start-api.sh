@@ -7,29 +7,39 @@ REDIS_CONF="/etc/redis/redis.conf"
 # Stop the Redis service if it is running as a service
 sudo service redis stop
 
+# Redis holds state that exists nowhere else (booking holders, the booking
+# write-behind queue, the change log, search documents) and has no TTL on
+# it. Under memory pressure only keys with a TTL (caches, sessions, locks)
+# may be evicted. The cap is sized for a search document per event, and can
+# be overridden from .env.
+REDIS_MAXMEMORY="${REDIS_MAXMEMORY:-1gb}"
+REDIS_MAXMEMORY_POLICY="volatile-lru"
+
 # Check if Redis server is already running
 if pgrep -x "redis-server" > /dev/null
 then
     echo "Redis server is already running. Skipping start..."
+    redis-cli config set maxmemory $REDIS_MAXMEMORY
+    redis-cli config set maxmemory-policy $REDIS_MAXMEMORY_POLICY
 else
-    # Check if 'maxmemory' is already set to 100mb
-    if ! sudo grep -q '^maxmemory 100mb' $REDIS_CONF; then
+    # Check if 'maxmemory' is already set
+    if ! sudo grep -q "^maxmemory $REDIS_MAXMEMORY\$" $REDIS_CONF; then
         sudo cp $REDIS_CONF $REDIS_CONF.bak
-        sudo sed -i 's/^# *maxmemory .*/maxmemory 100mb/' $REDIS_CONF
-        echo "maxmemory updated to 100mb."
+        sudo sed -i "s/^#\? *maxmemory .*/maxmemory $REDIS_MAXMEMORY/" $REDIS_CONF
+        echo "maxmemory updated to $REDIS_MAXMEMORY."
     else
-        echo "maxmemory is already set to 100mb."
+        echo "maxmemory is already set to $REDIS_MAXMEMORY."
     fi
 
-    # Check if 'maxmemory-policy' is already set to allkeys-lru
-    if ! sudo grep -q '^maxmemory-policy allkeys-lru' $REDIS_CONF; then
-        sudo sed -i 's/^# *maxmemory-policy .*/maxmemory-policy allkeys-lru/' $REDIS_CONF
-        echo "maxmemory-policy updated to allkeys-lru."
+    # Check if 'maxmemory-policy' is already set
+    if ! sudo grep -q "^maxmemory-policy $REDIS_MAXMEMORY_POLICY" $REDIS_CONF; then
+        sudo sed -i "s/^#\? *maxmemory-policy .*/maxmemory-policy $REDIS_MAXMEMORY_POLICY/" $REDIS_CONF
+        echo "maxmemory-policy updated to $REDIS_MAXMEMORY_POLICY."
     else
-        echo "maxmemory-policy is already set to allkeys-lru."
+        echo "maxmemory-policy is already set to $REDIS_MAXMEMORY_POLICY."
     fi
         echo "Starting Redis server..."
-        sudo redis-server $REDIS_CONF --loadmodule ~/redis-stack-server/lib/redisbloom.so --daemonize yes
+        sudo redis-server $REDIS_CONF --loadmodule ~/redis-stack-server/lib/redisbloom.so --loadmodule ~/redis-stack-server/lib/redisearch.so --daemonize yes
     fi
 
 # Check the ENVIRONMENT variable from the .env file and run FastAPI accordingly
@@ -0,0 +1,48 @@
+"""
+Shared benchmark helpers.
+
+Every module here sets `pytestmark = pytest.mark.benchmark`, so these
+only run with `--benchmark`. Results are printed, so pass `-s` to see them; the
+assertions only hold each benchmark to a loose budget.
+"""
+import statistics
+
+import pytest
+
+
+def latency_summary(samples: list) -> dict:
+    """
+    Median, p95, p99 and max of latency samples in seconds, in milliseconds.
+    """
+    ordered = sorted(samples)
+
+    def percentile(share: float) -> float:
+        return ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000
+
+    return {
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(percentile(0.95), 3),
+        "p99_ms": round(percentile(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+@pytest.fixture
+def summarize():
+    """
+    `latency_summary`, for benchmark modules.
+    """
+    return latency_summary
+
+
+@pytest.fixture
+def report(capsys):
+    """
+    Print a titled block of benchmark results, past pytest's capture.
+    """
+    def write(title: str, rows: dict):
+        with capsys.disabled():
+            print(f"\n{title}")
+            for name, value in rows.items():
+                print(f"  {name}: {value}")
+    return write
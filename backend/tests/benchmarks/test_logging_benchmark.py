@@ -0,0 +1,108 @@
+"""
+What a log line costs the request path.
+
+Times the same record written with print(), through a synchronous JSON
+handler, and through the app's queued handler (setup_logging). Output
+goes to a stream whose writes take WRITE_DELAY, like a stdout pipe its
+reader is slow to drain. Calls are spaced out by CALL_GAP of busy work,
+like log lines between request handling; only the caller's time is
+counted.
+"""
+import logging
+import sys
+import time
+
+import pytest
+
+from app.utils import logging_utils
+from app.utils.logging_utils import JsonFormatter, setup_logging, shutdown_logging
+
+
+pytestmark = pytest.mark.benchmark
+
+CALLS = 1_000
+WRITE_DELAY = 0.0005
+CALL_GAP = 0.001
+QUEUED_P50_BUDGET_US = 100
+
+PAYLOAD = {
+    "event_id": "6f1c2e1a-8d1b-4c2e-9a51-0c7f3f1b2a11",
+    "user_id": "6650e1f2a1b2c3d4e5f60718",
+    "event": {"title": "Evening run", "description": "Easy pace. " * 40, "location": "Karura Forest",
+              "status": "active", "fee": 500, "capacity": 40},
+}
+
+
+class SlowStream:
+    """
+    A text stream whose every write blocks for WRITE_DELAY.
+    """
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text: str) -> int:
+        time.sleep(WRITE_DELAY)
+        self.lines.append(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def timed_calls(log_once) -> list:
+    """
+    Latency samples of `log_once`, with busy work between calls.
+    """
+    samples = []
+    for _ in range(CALLS):
+        began = time.perf_counter()
+        log_once()
+        samples.append(time.perf_counter() - began)
+        # Spin rather than sleep, so the CPU stays as warm as under load.
+        resume = time.perf_counter() + CALL_GAP
+        while time.perf_counter() < resume:
+            pass
+    return samples
+
+
+def test_queued_logging_overhead(monkeypatch, report, summarize):
+    stream = SlowStream()
+    results = {}
+
+    results["print"] = summarize(timed_calls(lambda: print("Event Object ", PAYLOAD, file=stream)))
+
+    sync_logger = logging.getLogger("bench.sync")
+    sync_logger.setLevel(logging.INFO)
+    sync_logger.propagate = False
+    sync_handler = logging.StreamHandler(stream)
+    sync_handler.setFormatter(JsonFormatter())
+    sync_logger.addHandler(sync_handler)
+    try:
+        results["sync JSON handler"] = summarize(timed_calls(
+            lambda: sync_logger.info("Stored event", extra={"msg_type": "event.created", "payload": PAYLOAD})))
+    finally:
+        sync_logger.removeHandler(sync_handler)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(sys, "stdout", stream)
+        setup_logging()
+    app_logger = logging.getLogger("app.bench")
+    dropped_before = logging_utils.queue_handler.dropped
+    try:
+        results["queued, kept"] = summarize(timed_calls(
+            lambda: app_logger.info("Stored event", extra={"msg_type": "event.created", "payload": PAYLOAD})))
+        results["queued, sampled at 10%"] = summarize(timed_calls(
+            lambda: app_logger.info("Stored event", extra={"msg_type": "event.stored", "payload": PAYLOAD})))
+        dropped = logging_utils.queue_handler.dropped - dropped_before
+    finally:
+        shutdown_logging()
+        app_root = logging.getLogger("app")
+        app_root.removeHandler(logging_utils.queue_handler)
+        app_root.propagate = True
+
+    report(f"Log call cost with a slow stdout, {CALLS:,} calls each", {
+        **results, "queued records dropped": dropped,
+    })
+    assert dropped == 0
+    assert results["queued, kept"]["p50_ms"] * 1000 < QUEUED_P50_BUDGET_US
+    assert results["queued, kept"]["p99_ms"] < results["sync JSON handler"]["p50_ms"]
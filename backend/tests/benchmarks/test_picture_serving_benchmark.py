@@ -0,0 +1,121 @@
+"""
+Profile picture serving throughput and memory.
+
+Stores one picture, then sends REQUESTS requests per kind through the
+picture route, CONCURRENCY at a time: whole originals, thumbnails, byte
+ranges and conditional requests. Requests go straight to the ASGI app, so
+this measures the app's own cost; without a server offering the pathsend
+extension FileResponse reads the file in chunks, which bounds memory by
+concurrency rather than file size. Peak Python memory is traced.
+"""
+import asyncio
+import io
+import os
+import time
+import tracemalloc
+
+import pytest
+from fastapi import FastAPI
+from PIL import Image
+
+from app.api.endpoints.user import user_router
+from app.services import picture_services
+from app.services.picture_services import store_picture, picture_etag
+from app.utils.picture_utils import shutdown_picture_pool
+
+
+pytestmark = pytest.mark.benchmark
+
+REQUESTS = 2_000
+CONCURRENCY = 64
+PICTURE_SIZE = (2400, 1800)
+PEAK_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+async def get(app, path: str, query: str = "", headers: dict = None) -> tuple:
+    """
+    Send one GET through the ASGI app. Returns the status and body length.
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode("utf-8"), "root_path": "",
+        "query_string": query.encode("utf-8"),
+        "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    finished = asyncio.Event()
+    response = {"status": None, "length": 0}
+
+    async def receive():
+        if not response.get("requested"):
+            response["requested"] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["length"] += len(message.get("body", b""))
+            if not message.get("more_body"):
+                finished.set()
+
+    await app(scope, receive, send)
+    finished.set()
+    return response["status"], response["length"]
+
+
+def test_concurrent_reads(tmp_path, monkeypatch, report):
+    monkeypatch.setattr(picture_services, "PICTURES_DIR", tmp_path)
+    image = Image.frombytes("RGB", PICTURE_SIZE, os.urandom(PICTURE_SIZE[0] * PICTURE_SIZE[1] * 3))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    picture = output.getvalue()
+
+    app = FastAPI()
+    app.include_router(user_router, prefix="/users")
+
+    async def scenario():
+        async def chunks():
+            yield picture
+
+        digest, picture_type = await store_picture(chunks(), len(picture))
+        path = f"/users/pictures/{digest}.{picture_type}"
+        kinds = {
+            "original": ({}, "", 200, len(picture)),
+            "thumbnail 256": ({}, "size=256", 200, None),
+            "range 64 KB": ({"Range": "bytes=0-65535"}, "", 206, 65536),
+            "conditional": ({"If-None-Match": picture_etag(digest)}, "", 304, 0),
+        }
+        picture_services.picture_metadata.clear()
+        results = {}
+        tracemalloc.start()
+        for name, (headers, query, expected_status, expected_length) in kinds.items():
+            semaphore = asyncio.Semaphore(CONCURRENCY)
+
+            async def one():
+                async with semaphore:
+                    return await get(app, path, query, headers)
+
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(one() for _ in range(REQUESTS)))
+            elapsed = time.perf_counter() - started
+            assert {status for status, _ in responses} == {expected_status}, name
+            if expected_length is not None:
+                assert {length for _, length in responses} == {expected_length}, name
+            served = sum(length for _, length in responses)
+            results[name] = f"{REQUESTS / elapsed:,.0f} req/s, {served / elapsed / (1024 * 1024):,.0f} MB/s"
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return results, peak
+
+    try:
+        results, peak = asyncio.run(scenario())
+    finally:
+        shutdown_picture_pool()
+
+    report(f"Picture serving, {REQUESTS:,} requests per kind, {CONCURRENCY} at a time", {
+        **results, "peak traced memory": f"{peak / (1024 * 1024):.1f} MiB",
+    })
+    assert peak < PEAK_MEMORY_BUDGET
@@ -0,0 +1,101 @@
+"""
+Profile picture upload throughput.
+
+Streams UPLOADS distinct JPEGs through store_picture, CONCURRENCY at a
+time, the way PUT /users/me/picture receives them, then uploads them all
+again to time the deduplicated path. A heartbeat task records the longest
+the event loop went without running, to show decoding and resizing stay
+off it. Pictures are stored under a temporary PICTURES_DIR.
+"""
+import asyncio
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from app.services import picture_services
+from app.services.picture_services import store_picture
+from app.utils.picture_utils import shutdown_picture_pool
+
+
+pytestmark = pytest.mark.benchmark
+
+UPLOADS = 32
+CONCURRENCY = 8
+PICTURE_SIZE = (1600, 1200)
+BODY_CHUNK = 64 * 1024
+LOOP_LAG_BUDGET_SECONDS = 0.1
+
+
+def make_picture() -> bytes:
+    """
+    A JPEG of random noise, so every picture has its own digest.
+    """
+    image = Image.frombytes("RGB", PICTURE_SIZE, os.urandom(PICTURE_SIZE[0] * PICTURE_SIZE[1] * 3))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+async def body(picture: bytes):
+    """
+    A request body arriving in chunks.
+    """
+    for start in range(0, len(picture), BODY_CHUNK):
+        yield picture[start:start + BODY_CHUNK]
+        await asyncio.sleep(0)
+
+
+def test_concurrent_uploads(tmp_path, monkeypatch, report):
+    monkeypatch.setattr(picture_services, "PICTURES_DIR", tmp_path)
+    pictures = [make_picture() for _ in range(UPLOADS + 1)]
+
+    async def scenario():
+        longest_gap = 0.0
+
+        async def heartbeat():
+            nonlocal longest_gap
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                longest_gap = max(longest_gap, now - last)
+                last = now
+
+        async def upload_all(batch: list) -> float:
+            semaphore = asyncio.Semaphore(CONCURRENCY)
+
+            async def upload(picture: bytes):
+                async with semaphore:
+                    return await store_picture(body(picture), len(picture))
+
+            started = time.perf_counter()
+            stored = await asyncio.gather(*(upload(picture) for picture in batch))
+            assert len({digest for digest, _ in stored}) == len(batch)
+            return time.perf_counter() - started
+
+        await upload_all(pictures[:1])  # Start the pool's worker processes.
+        ticker = asyncio.create_task(heartbeat())
+        try:
+            fresh = await upload_all(pictures[1:])
+            fresh_gap, longest_gap = longest_gap, 0.0
+            duplicate = await upload_all(pictures[1:])
+            return fresh, duplicate, fresh_gap
+        finally:
+            ticker.cancel()
+
+    try:
+        fresh, duplicate, loop_gap = asyncio.run(scenario())
+    finally:
+        shutdown_picture_pool()
+
+    megabytes = sum(len(picture) for picture in pictures[1:]) / (1024 * 1024)
+    report(f"{UPLOADS} uploads of {megabytes / UPLOADS:.1f} MB, {CONCURRENCY} at a time", {
+        "new pictures": f"{UPLOADS / fresh:.1f} uploads/s, {megabytes / fresh:.1f} MB/s",
+        "duplicates": f"{UPLOADS / duplicate:.1f} uploads/s, {megabytes / duplicate:.1f} MB/s",
+        "longest event loop stall": f"{loop_gap * 1000:.1f} ms",
+    })
+    assert loop_gap < LOOP_LAG_BUDGET_SECONDS
+    assert duplicate < fresh
@@ -0,0 +1,80 @@
+"""
+Idle SSE subscribers on one worker.
+
+Opens SUBSCRIBERS change streams the way GET /events/stream does, half
+for the whole feed and half for one group, and measures the Python memory
+each idle connection holds (the generator, its subscriber and queue; not
+the socket or server buffers). It then times one published change
+reaching every subscriber. Runs in-process, with the Redis listener
+replaced by a no-op.
+"""
+import asyncio
+import gc
+import time
+import tracemalloc
+
+import pytest
+
+from app.services import push_services
+from app.utils.push_utils import Broadcaster
+
+
+pytestmark = pytest.mark.benchmark
+
+SUBSCRIBERS = 10_000
+BYTES_PER_CONNECTION_BUDGET = 16 * 1024
+FANOUT_BUDGET_SECONDS = 2.0
+
+
+async def idle_listener(self):
+    await asyncio.Event().wait()
+
+
+def test_idle_subscribers(monkeypatch, report):
+    monkeypatch.setattr(Broadcaster, "listen", idle_listener)
+    broadcaster = Broadcaster()
+    monkeypatch.setattr(push_services, "broadcaster", broadcaster)
+
+    async def scenario():
+        received = 0
+        all_received = asyncio.Event()
+
+        async def connection(group_id: str):
+            nonlocal received
+            async for frame in push_services.stream_event_changes(group_id):
+                if frame.startswith("id:"):
+                    received += 1
+                    if received == SUBSCRIBERS:
+                        all_received.set()
+
+        gc.collect()
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        connections = [asyncio.create_task(connection(None if number % 2 else "group-1"))
+                       for number in range(SUBSCRIBERS)]
+        while len(broadcaster.subscribers) < SUBSCRIBERS:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)  # Let every stream reach its idle wait.
+        gc.collect()
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        broadcaster.deliver({"seq": 1, "op": "created", "group_id": "group-1", "event_id": "event-1", "event": {}})
+        await asyncio.wait_for(all_received.wait(), 10)
+        fanout = time.perf_counter() - started
+
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        broadcaster.listener.cancel()
+        return (held - baseline) / SUBSCRIBERS, fanout
+
+    per_connection, fanout = asyncio.run(scenario())
+    report(f"{SUBSCRIBERS:,} idle SSE subscribers", {
+        "memory per connection": f"{per_connection / 1024:.1f} KiB",
+        "memory total": f"{per_connection * SUBSCRIBERS / (1024 * 1024):.1f} MiB",
+        "fan-out of one change": f"{fanout * 1000:.1f} ms",
+    })
+    assert per_connection < BYTES_PER_CONNECTION_BUDGET
+    assert fanout < FANOUT_BUDGET_SECONDS
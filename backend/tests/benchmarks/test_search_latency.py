@@ -0,0 +1,128 @@
+"""
+Latency of event search queries over a large index.
+
+Loads BENCH_SEARCH_EVENTS synthetic events (default 1,000,000) into a
+separate RediSearch index with the app's schema, then times the app's
+query builder and index lookup for each query shape, and the cache hit
+path. The page's events are read from Mongo afterwards, which this does
+not include. Needs redis-stack.
+"""
+import asyncio
+import os
+import random
+import time
+
+import aioredis
+import pytest
+
+from app.db.redis_client import redis_client
+from app.utils import search_utils
+from app.utils.search_utils import SEARCH_SCHEMA, build_search_query, search_doc, search_event_index
+from app.utils.search_utils import search_cache_key, get_cached_search, cache_search
+
+
+pytestmark = pytest.mark.benchmark
+
+EVENT_COUNT = int(os.environ.get("BENCH_SEARCH_EVENTS", 1_000_000))
+GROUP_COUNT = 10_000
+LOAD_BATCH = 10_000
+QUERY_RUNS = 200
+PAGE_SIZE = 20
+BENCH_INDEX = "bench:idx:events"
+BENCH_PREFIX = "bench:event:"
+P95_BUDGET_MS = 100
+
+SYLLABLES = ["ka", "ri", "mo", "ta", "ne", "lu", "si", "zo", "pa", "ve", "do", "mi", "ra", "go", "be"]
+
+
+def vocabulary(rng: random.Random, size: int = 5000) -> list:
+    """
+    Distinct made-up words of three to five syllables.
+    """
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5))))
+    return sorted(words)
+
+
+async def load_events(client, words: list, rng: random.Random):
+    """
+    Create the benchmark index and fill it with EVENT_COUNT event hashes.
+    """
+    await client.execute_command("FT.CREATE", BENCH_INDEX, "ON", "HASH", "PREFIX", 1, BENCH_PREFIX,
+                                 "SCHEMA", *SEARCH_SCHEMA)
+    now = time.time()
+    for start in range(0, EVENT_COUNT, LOAD_BATCH):
+        pipe = client.pipeline(transaction=False)
+        for number in range(start, min(start + LOAD_BATCH, EVENT_COUNT)):
+            group_id = f"group{number % GROUP_COUNT}"
+            event_id = f"event{number}"
+            event = {
+                "title": " ".join(rng.choices(words, k=3)),
+                "description": " ".join(rng.choices(words, k=12)),
+                "location": " ".join(rng.choices(words, k=2)),
+                "status": "active" if number % 10 else "cancelled",
+            }
+            timestamp = now + rng.uniform(-180, 180) * 86400
+            pipe.hset(f"{BENCH_PREFIX}{group_id}:{event_id}",
+                      mapping=search_doc(group_id, event_id, event, timestamp))
+        await pipe.execute()
+
+
+def test_search_latency_at_scale(redis_host, monkeypatch, report, summarize):
+    rng = random.Random(42)
+    words = vocabulary(rng)
+    common, rare = words[0], words[-1]
+    now = time.time()
+    shapes = {
+        "one word": (common, None, None, None),
+        "prefix": (common[:3], None, None, None),
+        "typo": (rare[:-1] + ("a" if rare[-1] != "a" else "o"), None, None, None),
+        "two words": (f"{common} {rare}", None, None, None),
+        "word + status": (common, "active", None, None),
+        "word + next 30 days": (common, None, now, now + 30 * 86400),
+    }
+    monkeypatch.setattr(search_utils, "SEARCH_INDEX_NAME", BENCH_INDEX)
+
+    async def scenario():
+        loader = aioredis.Redis(host=redis_host, socket_timeout=60)
+        cache_keys = []
+        try:
+            started = time.monotonic()
+            await load_events(loader, words, rng)
+            load_seconds = time.monotonic() - started
+
+            results = {}
+            for name, (text, event_status, start, end) in shapes.items():
+                query = build_search_query(text, event_status, start, end)
+                await search_event_index(query, 0, PAGE_SIZE)  # Warm up.
+                samples = []
+                for _ in range(QUERY_RUNS):
+                    began = time.perf_counter()
+                    total, entries = await search_event_index(query, 0, PAGE_SIZE)
+                    samples.append(time.perf_counter() - began)
+                results[name] = {"hits": total, **summarize(samples)}
+                assert entries, f"no results for {name}"
+
+            key = search_cache_key({"bench": True, "text": common})
+            cache_keys.append(key)
+            total, entries = await search_event_index(build_search_query(common), 0, PAGE_SIZE)
+            await cache_search(key, total, entries)
+            samples = []
+            for _ in range(QUERY_RUNS):
+                began = time.perf_counter()
+                assert await get_cached_search(key)
+                samples.append(time.perf_counter() - began)
+            results["cache hit"] = summarize(samples)
+            return load_seconds, results
+        finally:
+            if cache_keys:
+                await loader.delete(*cache_keys)
+            await loader.execute_command("FT.DROPINDEX", BENCH_INDEX, "DD")
+            await loader.connection_pool.disconnect()
+            await redis_client.connection_pool.disconnect()
+
+    load_seconds, results = asyncio.run(scenario())
+    report(f"Search latency, {EVENT_COUNT:,} events (loaded in {load_seconds:.0f} s)", results)
+    for name, result in results.items():
+        assert result["p95_ms"] < P95_BUDGET_MS, name
@@ -0,0 +1,94 @@
+"""
+Organizer stats: the incrementally maintained analytics document against
+aggregating the organizer's events on every read.
+
+For organizers with 100, 1,000 and 10,000 events, times the single lookup
+GET /users/me/stats does, the aggregation it replaces, and the $inc delta
+each event write now pays. Uses a separate database on a live Mongo.
+"""
+import asyncio
+import random
+import time
+import uuid
+
+import pytest
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.services import stats_services
+from app.services.stats_services import apply_event_stats, recompute_user_stats, stats_pipeline
+
+
+pytestmark = pytest.mark.benchmark
+
+EVENT_COUNTS = (100, 1_000, 10_000)
+RUNS = 200
+BENCH_DATABASE = "FitConnect_bench"
+
+
+def make_event(rng: random.Random) -> dict:
+    """
+    An event as stored in a user document.
+    """
+    return {
+        "title": "Evening run",
+        "description": "Easy pace, all levels welcome.",
+        "location": "Karura Forest",
+        "date": "2026-11-01T17:00:00Z",
+        "status": rng.choice(["active", "active", "active", "cancelled"]),
+        "fee": rng.choice([0, 500, 1000]),
+        "capacity": rng.choice([None, 20, 50]),
+        "support_contact": "+254700000000",
+        "after_booking_message": "See you there.",
+        "version": 1,
+    }
+
+
+async def timed(call, runs: int = RUNS) -> list:
+    """
+    Latency samples of awaiting `call()` `runs` times.
+    """
+    samples = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - began)
+    return samples
+
+
+def test_stats_lookup_against_aggregation(mongo_host, monkeypatch, report, summarize):
+    rng = random.Random(7)
+
+    async def scenario():
+        client = AsyncIOMotorClient(f"mongodb://{mongo_host}:27017/")
+        database = client[BENCH_DATABASE]
+        monkeypatch.setattr(stats_services, "users_collection", database.users)
+        monkeypatch.setattr(stats_services, "analytics_collection", database.analytics)
+        results = {}
+        try:
+            for count in EVENT_COUNTS:
+                user_id = str(ObjectId())
+                events = {str(uuid.uuid4()): make_event(rng) for _ in range(count)}
+                await database.users.insert_one({"_id": ObjectId(user_id), "events": events})
+                await recompute_user_stats(user_id)
+
+                lookup = await timed(lambda: database.analytics.find_one({"_id": ObjectId(user_id)}, {"_id": 0}))
+                aggregation = await timed(lambda: database.users.aggregate(stats_pipeline(user_id)).to_list(None))
+                before = next(iter(events.values()))
+                after = {**before, "status": "cancelled" if before["status"] == "active" else "active"}
+                delta = await timed(lambda: apply_event_stats(user_id, before=before, after=after))
+
+                results[f"{count:,} events"] = {
+                    "lookup": summarize(lookup),
+                    "aggregation": summarize(aggregation),
+                    "write delta": summarize(delta),
+                }
+        finally:
+            await client.drop_database(BENCH_DATABASE)
+            client.close()
+        return results
+
+    results = asyncio.run(scenario())
+    report("Organizer stats read paths", results)
+    largest = results[f"{EVENT_COUNTS[-1]:,} events"]
+    assert largest["lookup"]["p50_ms"] < largest["aggregation"]["p50_ms"]
@@ -0,0 +1,89 @@
+"""
+Shared test setup.
+
+Run from the backend directory with `python -m pytest tests`. Tests that
+need a live Redis (redis-stack) or Mongo use the `redis_host` and
+`mongo_host` fixtures and are skipped when none answers on REDIS_HOST or
+MONGO_HOST (default localhost).
+
+The benchmarks in tests/benchmarks only run with `--benchmark`, e.g.
+`python -m pytest tests/benchmarks --benchmark -s`.
+"""
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# app.core.config is each developer's local, untracked settings module.
+# Without one, tests read the same settings from the environment.
+try:
+    import app.core.config  # noqa: F401
+except ImportError:
+    config = types.ModuleType("app.core.config")
+    config.REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+    config.MONGO_HOST = os.environ.get("MONGO_HOST", "localhost")
+    config.TOKEN_KEY = os.environ.get("TOKEN_KEY", "test-token-key")
+    core = types.ModuleType("app.core")
+    core.config = config
+    sys.modules["app.core"] = core
+    sys.modules["app.core.config"] = config
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmark", action="store_true", help="run the benchmarks in tests/benchmarks")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: slow benchmark, run with --benchmark")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+def server_is_up(host: str, port: int) -> bool:
+    """
+    Whether a server accepts connections on host:port.
+    """
+    async def ping():
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), 0.5)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+    return asyncio.run(ping())
+
+
+@pytest.fixture(scope="session")
+def redis_host() -> str:
+    """
+    Host of a live Redis, or skip the test.
+    """
+    host = os.environ.get("REDIS_HOST", "localhost")
+    if not server_is_up(host, 6379):
+        pytest.skip(f"no Redis on {host}:6379")
+    return host
+
+
+@pytest.fixture(scope="session")
+def mongo_host() -> str:
+    """
+    Host of a live Mongo, or skip the test.
+    """
+    host = os.environ.get("MONGO_HOST", "localhost")
+    if not server_is_up(host, 27017):
+        pytest.skip(f"no Mongo on {host}:27017")
+    return host
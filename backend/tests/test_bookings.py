@@ -0,0 +1,205 @@
+"""
+Tests for event bookings.
+
+The reserve script tests run against a live Redis, and the service tests
+against a live Redis and Mongo (a separate database). Each test uses its
+own event, pending-queue and lock keys, so nothing reaches the app's real
+queue.
+"""
+import asyncio
+import json
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import aioredis
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.db.redis_client import redis_client
+from app.services import booking_services
+from app.services.booking_services import book_event, flush_bookings
+from app.utils import booking_utils
+from app.utils.booking_utils import RESERVE_SCRIPT, booking_event_key, booking_holders_key, booking_details
+from app.utils.booking_utils import RESERVED, ALREADY_BOOKED, SOLD_OUT, NOT_LOADED, WRONG_GROUP
+
+
+GROUP_ID = "group-1"
+LOAD_REQUESTS = 10_000
+LOAD_CAPACITY = 100
+LOAD_CONNECTIONS = 50
+TEST_DATABASE = "FitConnect_test"
+
+
+async def open_event(client, event: dict = None) -> tuple:
+    """
+    Keys and reserve script for a fresh test event, loaded if `event` is given.
+    """
+    event_id = f"test-{uuid.uuid4()}"
+    keys = [booking_event_key(event_id), booking_holders_key(event_id), f"booking:pending:{event_id}"]
+    if event is not None:
+        await client.hset(keys[0], mapping=booking_details(GROUP_ID, event))
+    return keys, client.register_script(RESERVE_SCRIPT)
+
+
+async def reserve(script, keys: list, holder: str, group_id: str = GROUP_ID) -> tuple:
+    """
+    Run one reservation, returning (outcome, booking ID).
+    """
+    booking_id = str(uuid.uuid4())
+    booking_json = json.dumps({"booking_id": booking_id, "event_id": keys[0], "holder": holder})
+    outcome, reserved_id = await script(keys=keys, args=[holder, booking_id, booking_json, group_id])
+    return outcome, reserved_id.decode("utf-8") if isinstance(reserved_id, bytes) else reserved_id
+
+
+def run_with_client(redis_host: str, scenario):
+    """
+    Run `scenario(client)` on a bounded pool, as the app's workers would share Redis.
+    """
+    async def main():
+        pool = aioredis.BlockingConnectionPool(host=redis_host, max_connections=LOAD_CONNECTIONS)
+        client = aioredis.Redis(connection_pool=pool)
+        try:
+            await scenario(client)
+        finally:
+            await pool.disconnect()
+    asyncio.run(main())
+
+
+def test_concurrent_reservations_never_oversell(redis_host):
+    async def scenario(client):
+        keys, script = await open_event(client, {"status": "active", "capacity": LOAD_CAPACITY})
+        try:
+            # Every holder tries twice, so repeats race with first attempts.
+            holders = [f"user:{n % (LOAD_REQUESTS // 2)}" for n in range(LOAD_REQUESTS)]
+            results = await asyncio.gather(*(reserve(script, keys, holder) for holder in holders))
+
+            outcomes = Counter(outcome for outcome, _ in results)
+            assert outcomes[RESERVED] == LOAD_CAPACITY
+            assert set(outcomes) <= {RESERVED, ALREADY_BOOKED, SOLD_OUT}
+            assert await client.hlen(keys[1]) == LOAD_CAPACITY
+            assert await client.llen(keys[2]) == LOAD_CAPACITY
+
+            # A holder never ends up with two bookings.
+            booked = {}
+            for holder, (outcome, booking_id) in zip(holders, results):
+                if outcome in (RESERVED, ALREADY_BOOKED):
+                    assert booked.setdefault(holder, booking_id) == booking_id
+            assert len(booked) == LOAD_CAPACITY
+        finally:
+            await client.delete(*keys)
+
+    run_with_client(redis_host, scenario)
+
+
+def test_rebooking_returns_the_existing_booking(redis_host):
+    async def scenario(client):
+        keys, script = await open_event(client, {"status": "active", "capacity": 1})
+        try:
+            outcome, booking_id = await reserve(script, keys, "user:1")
+            assert outcome == RESERVED
+            assert await reserve(script, keys, "user:1") == (ALREADY_BOOKED, booking_id)
+            assert (await reserve(script, keys, "user:2"))[0] == SOLD_OUT
+            assert await client.llen(keys[2]) == 1
+        finally:
+            await client.delete(*keys)
+
+    run_with_client(redis_host, scenario)
+
+
+def test_unloaded_wrong_group_and_cancelled_events(redis_host):
+    async def scenario(client):
+        unloaded_keys, script = await open_event(client)
+        wrong_keys, _ = await open_event(client, {"status": "active", "capacity": 5})
+        cancelled_keys, _ = await open_event(client, {"status": "cancelled", "capacity": 5})
+        unlimited_keys, _ = await open_event(client, {"status": "active", "capacity": None})
+        try:
+            assert (await reserve(script, unloaded_keys, "user:1"))[0] == NOT_LOADED
+            assert (await reserve(script, wrong_keys, "user:1", group_id="group-2"))[0] == WRONG_GROUP
+            assert (await reserve(script, cancelled_keys, "user:1"))[0] == SOLD_OUT
+            results = await asyncio.gather(*(reserve(script, unlimited_keys, f"user:{n}") for n in range(200)))
+            assert all(outcome == RESERVED for outcome, _ in results)
+            for keys in (unloaded_keys, wrong_keys, cancelled_keys):
+                assert await client.llen(keys[2]) == 0
+        finally:
+            await client.delete(*unloaded_keys, *wrong_keys, *cancelled_keys, *unlimited_keys)
+
+    run_with_client(redis_host, scenario)
+
+
+def run_with_services(monkeypatch, mongo_host: str, scenario):
+    """
+    Run `scenario(database, pending_key)` with the booking services on a
+    test database and their own pending queue and flush lock.
+    """
+    suffix = uuid.uuid4()
+    pending_key = f"booking:pending:test-{suffix}"
+    lock_key = f"booking:flush:lock:test-{suffix}"
+    monkeypatch.setattr(booking_utils, "BOOKINGS_PENDING", pending_key)
+    monkeypatch.setattr(booking_services, "BOOKINGS_PENDING", pending_key)
+    monkeypatch.setattr(booking_services, "BOOKINGS_FLUSH_LOCK", lock_key)
+
+    async def main():
+        client = AsyncIOMotorClient(f"mongodb://{mongo_host}:27017/")
+        database = client[TEST_DATABASE]
+        monkeypatch.setattr(booking_services, "users_collection", database.users)
+        monkeypatch.setattr(booking_services, "bookings_collection", database.bookings)
+        await database.bookings.create_index([("event_id", 1), ("holder", 1)], unique=True)
+        try:
+            await scenario(database, pending_key)
+        finally:
+            await redis_client.delete(pending_key, lock_key)
+            await client.drop_database(TEST_DATABASE)
+            client.close()
+            await redis_client.connection_pool.disconnect()
+    asyncio.run(main())
+
+
+def queued_booking(booking_id: str, event_id: str, group_id: str, holder: str) -> str:
+    return json.dumps({"booking_id": booking_id, "event_id": event_id, "group_id": group_id,
+                       "holder": holder, "created_at": datetime.now(timezone.utc).isoformat()})
+
+
+def test_first_booking_loads_persisted_and_queued_bookings(redis_host, mongo_host, monkeypatch):
+    async def scenario(database, pending_key):
+        group_id, event_id = str(ObjectId()), f"test-{uuid.uuid4()}"
+        await database.users.insert_one({"_id": ObjectId(group_id), "events": {
+            event_id: {"title": "Evening run", "status": "active", "capacity": 2, "fee": 500},
+        }})
+        await database.bookings.insert_one({"_id": "persisted", "event_id": event_id, "holder": "user:1"})
+        await redis_client.rpush(pending_key, queued_booking("queued", event_id, group_id, "user:2"))
+        try:
+            # The event is not in Redis yet, so the first call loads it with both bookings.
+            first = await book_event(group_id, event_id, "user:1")
+            assert (first["booking_id"], first["already_booked"], first["fee"]) == ("persisted", True, 500)
+            second = await book_event(group_id, event_id, "user:2")
+            assert (second["booking_id"], second["already_booked"]) == ("queued", True)
+            with pytest.raises(HTTPException) as sold_out:
+                await book_event(group_id, event_id, "user:3")
+            assert sold_out.value.status_code == 409
+            assert await redis_client.llen(pending_key) == 1
+        finally:
+            await redis_client.delete(booking_event_key(event_id), booking_holders_key(event_id))
+
+    run_with_services(monkeypatch, mongo_host, scenario)
+
+
+def test_flush_skips_bookings_already_persisted(redis_host, mongo_host, monkeypatch):
+    async def scenario(database, pending_key):
+        group_id, event_id = str(ObjectId()), f"test-{uuid.uuid4()}"
+        await database.bookings.insert_one({"_id": "persisted", "event_id": event_id, "holder": "user:1"})
+        # user:1 is queued again under another ID, as after a reload raced a flush.
+        await redis_client.rpush(pending_key,
+                                 queued_booking("duplicate", event_id, group_id, "user:1"),
+                                 queued_booking("new", event_id, group_id, "user:2"))
+
+        assert await flush_bookings() == 2
+        assert await redis_client.llen(pending_key) == 0
+        stored = await database.bookings.find({"event_id": event_id}).to_list(None)
+        assert {(booking["_id"], booking["holder"]) for booking in stored} == {
+            ("persisted", "user:1"), ("new", "user:2"),
+        }
+
+    run_with_services(monkeypatch, mongo_host, scenario)
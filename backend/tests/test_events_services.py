@@ -0,0 +1,25 @@
+"""
+Tests for what follows a committed event write.
+"""
+import asyncio
+
+from app.db.resilience import DatastoreUnavailable
+from app.services.events_services import apply_derived_updates
+
+
+def test_failed_derived_update_does_not_stop_the_rest(caplog):
+    ran = []
+
+    async def update(name: str, fail: bool = False):
+        ran.append(name)
+        if fail:
+            raise DatastoreUnavailable("redis unavailable")
+
+    asyncio.run(apply_derived_updates("user-1", "event-1", [
+        ("index", update("index")),
+        ("stats", update("stats", fail=True)),
+        ("publish", update("publish")),
+    ]))
+
+    assert ran == ["index", "stats", "publish"]
+    assert any(getattr(record, "payload", {}).get("step") == "stats" for record in caplog.records)
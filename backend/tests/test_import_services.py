@@ -0,0 +1,43 @@
+"""
+Tests for reading import rows.
+"""
+import csv
+import io
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from app.schemas.events.event_requests import IncomingEventSchema
+from app.services.events_services import EXPORT_FIELDS
+from app.services.import_services import parse_row
+
+
+EVENT = {
+    "title": "Morning run",
+    "description": "",
+    "location": "Karura Forest",
+    "date": datetime(2026, 11, 1, 6, 30, tzinfo=timezone.utc),
+    "status": "active",
+    "fee": 0,
+    "support_contact": "+254700000000",
+    "after_booking_message": "See you there.",
+    "capacity": None,
+}
+
+
+def test_exported_csv_imports_again():
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerow(jsonable_encoder({**EVENT, "event_id": "event-1"}))
+
+    row = next(csv.DictReader(io.StringIO(buffer.getvalue())))
+    event = IncomingEventSchema(**parse_row("csv", row))
+
+    assert event.capacity is None
+    assert event.description == ""
+    assert event.date == EVENT["date"]
+
+
+def test_ndjson_rows_are_parsed_as_json():
+    assert parse_row("ndjson", '{"capacity": null, "fee": 5}') == {"capacity": None, "fee": 5}
@@ -0,0 +1,45 @@
+"""
+Tests for replaying the change log to SSE clients.
+"""
+import asyncio
+
+from app.services import push_services
+
+
+def collect(generator) -> list:
+    async def main():
+        return [message async for message in generator]
+    return asyncio.run(main())
+
+
+def test_group_replay_skips_batches_without_its_changes(monkeypatch):
+    # 1200 changes for other groups come before the one for group-1.
+    log = [(sequence, "group-2", f"event-{sequence}", False) for sequence in range(1, 1201)]
+    log.append((1201, "group-1", "event-1201", False))
+
+    async def read_changes(since, limit):
+        entries = [change for change in log if change[0] > since]
+        return entries[:limit], len(entries) > limit
+
+    async def fetch_events(entries):
+        return [{"event_id": event_id} for _, event_id in entries]
+
+    async def get_sync_position():
+        return 1201, 0
+
+    monkeypatch.setattr(push_services, "read_changes", read_changes)
+    monkeypatch.setattr(push_services, "fetch_events", fetch_events)
+    monkeypatch.setattr(push_services, "get_sync_position", get_sync_position)
+
+    messages = collect(push_services.replay_changes(0, "group-1"))
+    assert [(message["seq"], message["op"]) for message in messages] == [(1201, "updated")]
+
+
+def test_replay_below_floor_is_a_reset(monkeypatch):
+    async def get_sync_position():
+        return 90, 40
+
+    monkeypatch.setattr(push_services, "get_sync_position", get_sync_position)
+
+    messages = collect(push_services.replay_changes(10))
+    assert [(message["seq"], message["op"]) for message in messages] == [(90, "reset")]
@@ -0,0 +1,229 @@
+"""
+Tests for app.db.resilience.
+
+The unit tests drive `guarded` with fake calls. The fault-injection tests
+put a TCP proxy between a client and a live Redis and black-hole or
+refuse its traffic, to check that a dead Redis costs a bounded time, trips
+the breaker and recovers once it is back.
+"""
+import asyncio
+import time
+
+import aioredis
+import pytest
+import redis as sync_redis
+from aioredis.exceptions import ConnectionError as RedisConnectionError
+
+from app.db import resilience
+from app.db.resilience import CircuitBreaker, DatastoreUnavailable, guarded, redis_call, redis_sync_call
+
+
+@pytest.fixture(autouse=True)
+def fast_resilience(monkeypatch):
+    """
+    Fresh breakers and short timeouts for every test.
+    """
+    monkeypatch.setitem(resilience.BREAKERS, "redis", CircuitBreaker("redis", failure_threshold=3, reset_timeout=0.3))
+    monkeypatch.setitem(resilience.BREAKERS, "mongo", CircuitBreaker("mongo", failure_threshold=3, reset_timeout=0.3))
+    monkeypatch.setitem(resilience.TIMEOUTS, "redis", 0.2)
+    monkeypatch.setattr(resilience, "RETRY_BACKOFF", 0.01)
+
+
+class FaultyProxy:
+    """
+    TCP proxy in front of Redis. In "blackhole" mode requests are swallowed
+    so replies never come; in "refuse" mode new connections are closed.
+    """
+    def __init__(self, upstream_host: str, upstream_port: int = 6379):
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.mode = "pass"
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        if self.mode == "refuse":
+            writer.close()
+            return
+        upstream_reader, upstream_writer = await asyncio.open_connection(self.upstream_host, self.upstream_port)
+
+        async def pipe(source, destination, to_server: bool):
+            try:
+                while data := await source.read(65536):
+                    if to_server and self.mode != "pass":
+                        continue
+                    destination.write(data)
+                    await destination.drain()
+            except (ConnectionError, OSError):
+                pass
+            finally:
+                destination.close()
+
+        await asyncio.gather(pipe(reader, upstream_writer, True), pipe(upstream_reader, writer, False))
+
+
+def test_breaker_opens_at_threshold_and_half_opens_after_reset():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one trial call at a time.
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_only_idempotent_calls_are_retried():
+    resilience.BREAKERS["redis"] = CircuitBreaker("redis", failure_threshold=10)
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise RedisConnectionError("down")
+
+    with pytest.raises(DatastoreUnavailable):
+        asyncio.run(guarded("redis", failing))
+    assert len(calls) == 1
+
+    calls.clear()
+    with pytest.raises(DatastoreUnavailable):
+        asyncio.run(guarded("redis", failing, idempotent=True))
+    assert len(calls) == 1 + resilience.IDEMPOTENT_RETRIES
+
+
+def test_timeout_is_reported_as_unavailable():
+    async def hanging():
+        await asyncio.sleep(10)
+
+    started = time.monotonic()
+    with pytest.raises(DatastoreUnavailable):
+        asyncio.run(guarded("redis", hanging))
+    assert time.monotonic() - started < 1
+
+
+def test_application_errors_pass_through_and_keep_breaker_closed():
+    async def rejected():
+        raise ValueError("bad request")
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            asyncio.run(guarded("redis", rejected, idempotent=True))
+    assert resilience.BREAKERS["redis"].state == "closed"
+
+
+def test_open_breaker_fails_fast_without_calling():
+    calls = []
+
+    async def call():
+        calls.append(1)
+
+    breaker = resilience.BREAKERS["redis"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    with pytest.raises(DatastoreUnavailable, match="circuit open"):
+        asyncio.run(guarded("redis", call))
+    assert not calls
+
+
+def test_blackholed_redis_fails_fast_then_recovers(redis_host):
+    async def scenario():
+        proxy = FaultyProxy(redis_host)
+        await proxy.start()
+        client = aioredis.Redis(host="127.0.0.1", port=proxy.port, socket_timeout=2, socket_connect_timeout=2)
+        try:
+            await redis_call(client.set, "resilience:test", "1", idempotent=True)
+
+            proxy.mode = "blackhole"
+            started = time.monotonic()
+            with pytest.raises(DatastoreUnavailable):
+                await redis_call(client.get, "resilience:test", idempotent=True)
+            # Timeout per attempt, bounded retries, no hang.
+            assert time.monotonic() - started < 0.2 * (1 + resilience.IDEMPOTENT_RETRIES) + 0.5
+            assert resilience.BREAKERS["redis"].state == "open"
+
+            # While open, calls are refused without waiting on the network.
+            started = time.monotonic()
+            with pytest.raises(DatastoreUnavailable, match="circuit open"):
+                await redis_call(client.get, "resilience:test", idempotent=True)
+            assert time.monotonic() - started < 0.05
+
+            proxy.mode = "pass"
+            await client.connection_pool.disconnect()
+            await asyncio.sleep(0.35)
+            assert await redis_call(client.get, "resilience:test", idempotent=True) == b"1"
+            assert resilience.BREAKERS["redis"].state == "closed"
+        finally:
+            proxy.mode = "pass"
+            await client.delete("resilience:test")
+            await client.connection_pool.disconnect()
+            await proxy.stop()
+
+    asyncio.run(scenario())
+
+
+def test_refused_connections_are_unavailable(redis_host):
+    async def scenario():
+        proxy = FaultyProxy(redis_host)
+        await proxy.start()
+        proxy.mode = "refuse"
+        client = aioredis.Redis(host="127.0.0.1", port=proxy.port, socket_timeout=2, socket_connect_timeout=2)
+        try:
+            with pytest.raises(DatastoreUnavailable):
+                await redis_call(client.ping, idempotent=True)
+        finally:
+            await client.connection_pool.disconnect()
+            await proxy.stop()
+
+    asyncio.run(scenario())
+
+
+def test_blocking_client_does_not_stall_event_loop(redis_host):
+    async def scenario():
+        proxy = FaultyProxy(redis_host)
+        await proxy.start()
+        client = sync_redis.Redis(host="127.0.0.1", port=proxy.port, socket_timeout=0.3, socket_connect_timeout=0.3)
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(heartbeat())
+        try:
+            assert await redis_sync_call(client.ping, idempotent=True)
+            proxy.mode = "blackhole"
+            with pytest.raises(DatastoreUnavailable):
+                await redis_sync_call(client.ping)
+            # The loop kept running while the thread waited on the dead socket.
+            assert ticks >= 10
+        finally:
+            ticker.cancel()
+            proxy.mode = "pass"
+            client.close()
+            await proxy.stop()
+
+    asyncio.run(scenario())